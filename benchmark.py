@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+#####################################
+############ benchmark.py ###########
+#####################################
+# PURPOSE:
+#   Measure palebail's throughput end to end against the local mock S3 server, with
+# no network access needed. Every combination of engine, thread count and wordlist
+# size is run as its own palebail process, e.g.
+#
+#   python3 benchmark.py --engines thread,async --threads 1,4,16 --sizes 100,1000
+#
+# Wordlists, bucket hits and injected errors all come from --seed, so runs with the
+# same arguments are comparable. The mock is addressed path-style, so "hs saved" counts
+# the TCP/TLS handshakes avoided against virtual-host addressing, which needs at least
+# one connection per candidate hostname.
+
+# IMPORTS
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import mockserver
+
+# GLOBALS
+PALEBAIL = Path(__file__).parent / "palebail.py"
+COMBINATORS = ["-",""] # same as palebail.py
+HIT_STATES = ["denied","disabled","open","readable","writeable"]
+# (name, width, format) of each reported column
+COLUMNS = [
+    ("engine",7,""),("threads",7,""),("size",6,""),("candidates",10,""),
+    ("cand/s",9,".1f"),("req/cand",8,".2f"),("p99 ms",7,".1f"),
+    ("conns",6,""),("hs saved",8,""),("rss MB",7,".1f"),("wall s",7,".2f")
+]
+
+# HELPERS
+def csv(value,kind=str):
+    return [kind(v) for v in value.split(",") if v]
+
+def buildScan(directory,keyword,size,hitRate,seed):
+    """
+    PURPOSE: Write a modifiers wordlist and choose which candidates exist on the mock
+    INPUT: Output directory, keyword, number of modifiers, fraction of candidates that
+           exist, random seed
+    RETURN: (modifiers path, bucket specs for the mock server)
+    """
+    rng = random.Random(seed)
+    modifiers = ["m{:05d}".format(i) for i in range(size)]
+    path = Path(directory,"modifiers-{}.txt".format(size))
+    path.write_text("\n".join(modifiers) + "\n")
+    candidates = sorted({
+        name
+        for m in modifiers for c in COMBINATORS
+        for name in ("{}{}{}".format(m,c,keyword),"{}{}{}".format(keyword,c,m))
+    })
+    hits = rng.sample(candidates,int(len(candidates) * hitRate))
+    buckets = {name:{"state":HIT_STATES[i % len(HIT_STATES)],"objects":rng.randint(1,50)} for i, name in enumerate(hits)}
+    return path, buckets
+
+def runPalebail(server,directory,modifiers,keyword,engine,threads,concurrency,extra=[]):
+    """
+    PURPOSE: Run one palebail process against the mock and collect its metrics
+    INPUT: Mock server, scratch directory, modifiers path, keyword, engine, threads,
+           async concurrency, any extra palebail arguments
+    RETURN: dict with one row of results
+    """
+    prefix = str(Path(directory,"metrics-{}-{}".format(engine,threads)))
+    command = [
+        sys.executable,str(PALEBAIL),
+        "-k",keyword,"-m",str(modifiers),
+        "-t",str(threads),"-e",engine,"-c",str(concurrency),
+        "--addressing","path","--endpoint",server.url,
+        "--metrics",prefix
+    ] + extra
+    before = dict(server.stats)
+    start = time.monotonic()
+    # logs/ is created in the working directory, keep it out of the repo
+    process = subprocess.Popen(command,cwd=directory,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid,0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic() - start
+    with open(prefix + ".json","r") as f:
+        metrics = json.load(f)
+    counters = metrics['counters']
+    elapsed = max(metrics['exported'] - metrics['started'],1e-6)
+    candidates = counters.get('total',0)
+    connections = server.stats['connections'] - before['connections']
+    return {
+        "engine":engine,
+        "threads":threads,
+        "candidates":candidates,
+        "cand/s":candidates / elapsed,
+        "req/cand":counters.get('requests',0) / candidates if candidates else 0.0,
+        "p99 ms":metrics['overall']['p99'] * 1000,
+        "conns":connections,
+        "hs saved":max(0,candidates - connections),
+        "rss MB":usage.ru_maxrss / 1024, # KB on Linux
+        "wall s":wall,
+        "exit":process.returncode,
+        "found":counters.get('total',0) - counters.get('failed_hit',0)
+    }
+
+def printRow(row):
+    print(" ".join("{:>{}{}}".format(row[name],width,spec) for name, width, spec in COLUMNS))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="End to end palebail throughput against a local mock S3")
+    parser.add_argument("--engines", default="thread,async",
+        help="Comma separated engines to run (default thread,async)")
+    parser.add_argument("--threads", default="1,4,16",
+        help="Comma separated thread counts, at most 20 (default 1,4,16)")
+    parser.add_argument("--sizes", default="100,1000",
+        help="Comma separated modifier wordlist sizes (default 100,1000)")
+    parser.add_argument("--concurrency", type=int, default=200,
+        help="In-flight probes for the async engine (default 200)")
+    parser.add_argument("--keyword", default="acme",
+        help="Keyword the candidates are built around (default acme)")
+    parser.add_argument("--hit-rate", dest="hit_rate", type=float, default=0.01,
+        help="Fraction of candidates that exist on the mock (default 0.01)")
+    parser.add_argument("--latency", type=float, default=0.005,
+        help="Seconds the mock adds to every response (default 0.005)")
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0,
+        help="Fraction of mock responses that are 503 SlowDown (default 0)")
+    parser.add_argument("--repeat", type=int, default=1,
+        help="Runs per combination, the median run is reported (default 1)")
+    parser.add_argument("--seed", type=int, default=1,
+        help="Seed for wordlists, hits and injected errors (default 1)")
+    parser.add_argument("--json", dest="json",
+        help="Also write every result row to this JSON file")
+    parser.add_argument("extra", nargs="*",
+        help="Extra palebail arguments, after --, e.g. -- --metadata none")
+    args = parser.parse_args()
+
+    rows = []
+    print(" ".join("{:>{}}".format(name,width) for name, width, spec in COLUMNS))
+    with tempfile.TemporaryDirectory(prefix="palebail-bench-") as directory:
+        for size in csv(args.sizes,int):
+            modifiers, buckets = buildScan(directory,args.keyword,size,args.hit_rate,args.seed)
+            for engine in csv(args.engines):
+                for threads in csv(args.threads,int):
+                    runs = []
+                    for _ in range(args.repeat):
+                        # a fresh server per run, so injected errors repeat exactly
+                        server = mockserver.start(
+                            buckets=buckets,latency=args.latency,errorRate=args.error_rate,seed=args.seed
+                        )
+                        try:
+                            runs.append(runPalebail(
+                                server,directory,modifiers,args.keyword,engine,threads,
+                                args.concurrency,args.extra
+                            ))
+                        finally:
+                            server.shutdown()
+                            server.server_close()
+                    row = sorted(runs,key=lambda r: r['cand/s'])[len(runs) // 2]
+                    row['size'] = size
+                    row['expected'] = len(buckets)
+                    rows.append(row)
+                    printRow(row)
+                    if row['exit'] != 0:
+                        print("palebail exited with {}".format(row['exit']))
+    if args.json:
+        with open(args.json,"w") as f:
+            json.dump(rows,f,indent=2)
@@ -1,15 +1,121 @@
 #/usr/bin/env python3
+import time
+import queue
+import threading
+from urllib.parse import quote
 from xml.dom import minidom
 import xml.etree.ElementTree as ET
-import requests
+from transport import Transport, PROBE
+from names import normalize
+from classifier import classify, errorCode, isThrottled, THROTTLED, NONEXISTENT, LISTABLE, READABLE, OBJECT
+from regions import GLOBAL_REGION, regionFromEndpoint
 
 # GLOBALS
-TIMEOUT = 3
+# bucket subresources fetched by Bucket.metadata, in report order
+SUBRESOURCES = [
+    "acl","accelerate","cors","encryption","location",
+    "logging","policy","replication","website"
+]
+TITLES = {
+    "acl":"ACL",
+    "accelerate":"Accelerate",
+    "cors":"CORS",
+    "encryption":"Encryption",
+    "location":"Location",
+    "logging":"Logging",
+    "policy":"Policy",
+    "replication":"Replication",
+    "website":"Website"
+}
+# where bucket requests go, {bucket} is replaced with the bucket name
+ENDPOINT = "https://{bucket}.s3.amazonaws.com/"
+# where they go once the bucket's region is known, {region} is replaced with the region
+REGIONAL_ENDPOINT = "https://{bucket}.s3.{region}.amazonaws.com/"
+# path-style equivalents, every bucket shares one host and so one pool of connections
+PATH_ENDPOINT = "https://s3.amazonaws.com/{bucket}/"
+PATH_REGIONAL_ENDPOINT = "https://s3.{region}.amazonaws.com/{bucket}/"
+# error codes S3 answers with when a bucket lives behind another region's endpoint
+REDIRECTS = (b"PermanentRedirect",b"TemporaryRedirect")
+# per-bucket listing caps
+MAX_OBJECTS = 1000
+MAX_BYTES = 50 * 1024 * 1024
+MAX_SECONDS = 60
+CHUNK = 64 * 1024
+# listability probe, returns at most the one key isReadable needs
+PROBE_PARAMS = "?list-type=2&max-keys=1"
+PEEK = 1024 # most body bytes read by a readability check
+SPLIT_DEPTH = 3 # path levels a hot prefix may be split into for deep listing
+LISTING_QUEUE = 4096 # records buffered between deep listing partitions and the sink
 
 # HELPERS
 def xml_prettyprint(root):
     return minidom.parseString(ET.tostring(root)).toprettyxml(indent="\t")
 
+def localname(tag):
+    return tag.rsplit("}",1)[-1]
+
+def virtualHost(template):
+    """
+    PURPOSE: Turn a path-style URL template into its virtual-host equivalent
+    INPUT: Template like https://s3.amazonaws.com/{bucket}/
+    RETURN: Template like https://{bucket}.s3.amazonaws.com/, or None if the template
+            is not path-style
+    """
+    scheme, sep, rest = (template or "").partition("://")
+    host, _, path = rest.partition("/")
+    if not sep or "{bucket}" in host or not path.startswith("{bucket}"):
+        return None
+    return "{}://{{bucket}}.{}/{}".format(scheme,host,path[len("{bucket}"):].lstrip("/"))
+
+def redirectEndpoint(body):
+    # host named by the <Endpoint> of a redirect body, or ""
+    start = body.find(b"<Endpoint>")
+    end = body.find(b"</Endpoint>",start)
+    if start == -1 or end == -1:
+        return ""
+    return body[start+10:end].decode("ascii","replace")
+
+def redirectRegion(headers,body=b""):
+    """
+    PURPOSE: Find the bucket's region in a response
+    INPUT: Response headers, (optional) body bytes
+    RETURN: Region from the x-amz-bucket-region header or a redirect body's <Endpoint>,
+            or None
+    """
+    region = headers.get("x-amz-bucket-region")
+    if region is None and body and errorCode(body) in REDIRECTS:
+        region = regionFromEndpoint(redirectEndpoint(body))
+    return region
+
+class ListingBudget:
+    """
+    PURPOSE: Caps on objects, bytes and time shared by every partition of one listing
+    INPUT: Caps on objects listed, response bytes read and seconds spent
+    """
+
+    def __init__(self,maxObjects=MAX_OBJECTS,maxBytes=MAX_BYTES,maxSeconds=MAX_SECONDS):
+        self.maxObjects = maxObjects
+        self.maxBytes = maxBytes
+        self.deadline = time.monotonic() + maxSeconds
+        self.objects = 0
+        self.bytes = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def spend(self,objects=0,received=0):
+        """
+        PURPOSE: Count listed objects and bytes read against the caps
+        INPUT: Objects listed, bytes read
+        RETURN: False once any cap has been reached
+        """
+        with self.lock:
+            self.objects += objects
+            self.bytes += received
+            if self.objects >= self.maxObjects or self.bytes >= self.maxBytes \
+                    or time.monotonic() >= self.deadline:
+                self.exhausted = True
+        return not self.exhausted
+
 class Bucket:
     """
     PURPOSE: Provide an OOP structure to reference s3 buckets
@@ -18,7 +124,7 @@ class Bucket:
     |__[ATTR] NAME
     |_____ Name of the bucket
     |__[ATTR] STATUS
-    |_____ -1: Rate limit was hit and bucket was not assessed
+    |_____ -1: Rate limit was hit (by the probe or any later check) and bucket was not fully assessed
     |_____  0: Bucket does not exist
     |_____  1: Bucket exists but access is denied
     |_____  2: Bucket exists, but all access is disabled
@@ -31,12 +137,37 @@ class Bucket:
     |_____        of access achieved.
     |__[ATTR] CONTENT
     |_____ A newline separated list of [NUM,MODIFIED,OWNER,SIZE,FILENAME] retrieved from the bucket.
+    |_____ When enumContent is given a sink, the sink decides what (if anything) is kept here.
+    |__[ATTR] FIRSTOBJECT
+    |_____ Record of the one object returned by the listability probe, if any
+    |__[ATTR] OBJECTS
+    |_____ Number of objects listed
+    |__[ATTR] TRUNCATED
+    |_____ Boolean: True - listing stopped at the object, byte or time cap
     |__[ATTR] DOWNLOAD
     |_____ Boolean: True - the first file was downloadable
+    |__[ATTR] SAMPLED
+    |_____ (readable, checked) objects when readability is sampled over several objects
     |__[ATTR] WRITE
     |_____ Boolean: True - the bucket was writeable
     |_____ NOTE: This has not yet been implemented as we are attempting to find a way to reliably
     |_____       determine write capability without actually writing.
+    |__[ATTR] CHECKED
+    |_____ Boolean: True - assignState completed, so the status can be trusted and stored
+    |__[ATTR] REGION
+    |_____ Region reported by S3 in the x-amz-bucket-region header or a redirect body, or
+    |_____ known from the region cache, if any
+    |__[ATTR] REGIONAL
+    |_____ URL template used once the region is known (None - keep the endpoint URL)
+    |__[ATTR] REGIONS
+    |_____ Shared RegionCache the region is looked up in and recorded to
+    |__[ATTR] FALLBACK
+    |_____ (endpoint, regional) virtual-host templates for a path-style bucket, used once S3
+    |_____ redirects it to <bucket>.<host> without changing its region
+    |__[ATTR] VIRTUAL
+    |_____ Boolean: True - a path-style bucket fell back to virtual-host addressing
+    |__[ATTR] TRANSPORT
+    |_____ Shared Transport object every request for this bucket is sent through
     """
 
     name = ""
@@ -45,25 +176,94 @@ class Bucket:
     download = False
     write = False
     meta = ""
+    firstObject = None
+    sampled = None
+    objects = 0
+    truncated = False
+    checked = False
+    region = None
+    virtual = False
     headers = {
         "User-Agent":"Palebail v0.2.0"
     }
     
-    def __init__(self,name,badchars):
+    def __init__(self,name,badchars,transport=None,endpoint=ENDPOINT,regional=None,regions=None,fallback=None):
         #TODO: make this a list instead of string, enumerating possible names based on
         # the original name
-        self.name = name.lower()
-        for elem in badchars:
-            self.name = self.name.replace(elem,"") #TODO replace with more than just empty string (same TODO as above)
+        self.name = normalize(name,badchars) #TODO replace with more than just empty string (same TODO as above)
 
-        self.url = "https://{}.s3.amazonaws.com/".format(self.name)
-    
-    def checkRateLimit(self):
-        r = requests.get(self.url+"?location",timeout=TIMEOUT,headers=self.headers)
-        return True if ET.fromstring(r.text)[0].text != "NoSuchBucket" else False
+        self.url = endpoint.format(bucket=self.name)
+        self.globalURL = self.url
+        self.regional = regional
+        self.regions = regions
+        self.fallback = fallback
+        self.transport = transport if transport else Transport()
+        if regions:
+            self.setRegion(regions.lookup(self.name))
+
+    def setRegion(self,region):
+        """
+        PURPOSE: Point every later request for the bucket at its region's endpoint
+        INPUT: Region reported by S3 or the region cache (None is ignored)
+        RETURN: True if the bucket's URL changed
+        """
+        if not region or region == self.region:
+            return False
+        self.region = region
+        if self.regions:
+            self.regions.record(self.name,region)
+        if not self.regional:
+            return False
+        url = self.globalURL if region == GLOBAL_REGION else self.regional.format(bucket=self.name,region=region)
+        changed = url != self.url
+        self.url = url
+        return changed
+
+    def useVirtualHost(self):
+        """
+        PURPOSE: Move a path-style bucket to virtual-host addressing
+        INPUT: Self
+        RETURN: True if the bucket's URL changed
+        """
+        if not self.fallback or self.virtual:
+            return False
+        endpoint, regional = self.fallback
+        self.virtual = True
+        self.globalURL = endpoint.format(bucket=self.name)
+        self.regional = regional
+        old, self.url = self.url, self.globalURL
+        if self.region and self.region != GLOBAL_REGION and regional:
+            self.url = regional.format(bucket=self.name,region=self.region)
+        return self.url != old
+
+    def reroute(self,headers,body=b""):
+        """
+        PURPOSE: Follow what a response says about where the bucket must be addressed
+        INPUT: Response headers, (optional) body bytes
+        RETURN: True if the bucket's URL changed, so a redirected request is worth repeating
+        DOCS:
+        |__ A new region moves the bucket to that region's endpoint, in the same addressing
+        |__ style. A redirect to <bucket>.<host> within the same region means the endpoint
+        |__ won't serve the bucket path-style.
+        """
+        if self.setRegion(redirectRegion(headers,body)):
+            return True
+        if self.fallback and body and errorCode(body) in REDIRECTS:
+            if redirectEndpoint(body).startswith(self.name+"."):
+                return self.useVirtualHost()
+        return False
+
+    def countRoute(self):
+        # the global endpoint would have redirected this request
+        if self.regions and self.url != self.globalURL:
+            self.regions.saved()
+
+    def send(self,method,url,**kwargs):
+        self.countRoute()
+        return self.transport.request(method,url,**kwargs)
 
     def retrieveData(self,seshObj=False,params=""):
-        r = requests.get(self.url+params,headers=self.headers,timeout=TIMEOUT)
+        r = self.send("GET",self.url+params,kind="meta",headers=self.headers)
         return ET.fromstring(r.text) if not seshObj else r
 
     def isReadable(self,testURL):
@@ -71,24 +271,55 @@ class Bucket:
         PURPOSE: Test to see if FIRST object of a bucket is downloadable
         INPUT: Bucket object, URL for testing downloadablity
         RETURN: True if contents can be downloaded / read
+        DOCS:
+        |__ Only the first byte is requested and the body is never decoded, so the check
+        |__ costs the same few bytes whatever the object's size.
+        |__ A throttled check sets the status to THROTTLED, so the bucket is retried instead
+        |__ of being recorded as not readable.
         """
-        r = requests.get(testURL,timeout=TIMEOUT,headers=self.headers)
-        if "AccessDenied" not in r.text and "NoSuchKey" not in r.text:
-            return True
-        else:
-            self.status = 4
-            return False
-            
+        headers = dict(self.headers)
+        headers["Range"] = "bytes=0-0"
+        r = self.send("GET",testURL,kind="read",headers=headers,stream=True)
+        try:
+            # a 1 byte or error body is read to the end, so the connection goes back to the pool
+            self.transport.metrics.addBytes("read",r.status_code,len(next(r.iter_content(PEEK),b"")))
+        finally:
+            r.close()
+        status = classify(r.status_code,r.headers,kind=OBJECT)
+        if status == THROTTLED:
+            self.status = THROTTLED
+        return status == READABLE
+
+    def sampleReadable(self,count,executor=None):
+        """
+        PURPOSE: Check readability of up to count objects to estimate the readable fraction
+        INPUT: Number of objects to sample, (optional) executor to check them concurrently
+        RETURN: Fraction of sampled objects that are readable
+        """
+        budget = ListingBudget(count)
+        urls = [
+            self.url+record['key']
+            for kind, record in self.listStream(budget,pages=1,maxKeys=count)
+            if kind == "object" and record['key'] != ""
+        ]
+        if not urls:
+            self.sampled = (0,0)
+            return 0.0
+        results = list(executor.map(self.isReadable,urls) if executor else map(self.isReadable,urls))
+        self.sampled = (sum(results),len(results))
+        return self.sampled[0] / self.sampled[1]
 
     def isWriteable(self,retryURL=None):
         """
         PURPOSE: Test to see if a bucket can be written to
         INPUT: bucket object
-        RETURN: Boolean: True - it can be written to
+        RETURN: Boolean: True - it can be written to (a throttled PUT sets the status to THROTTLED)
         """
         endpoint = retryURL if retryURL else self.url
-        r = requests.put(
+        r = self.send(
+            "PUT",
             endpoint+"chonk.txt",
+            kind="write",
             headers={"Content-Type":"text/plain"},
             data="""
            .: BEWARE OF CHONKERS :.
@@ -103,129 +334,355 @@ class Bucket:
                     ( o.o )
                      > ^ <
             """,
-            timeout=TIMEOUT,
         )
-        if "TemporaryRedirect" in r.text:
-            root = ET.fromstring(r.text)
-            retryURL = root[2].text # redirect endpoint url
-            if self.isWriteable(retryURL):
-                return True
-        elif r.status_code == 200:
-            return True
-        else:
+        if isThrottled(r.status_code,r.content):
+            self.status = THROTTLED
             return False
+        if errorCode(r.content) in REDIRECTS:
+            old = self.url
+            if self.reroute(r.headers,r.content):
+                # try once more against the region S3 pointed us to
+                return self.isWriteable(self.url+endpoint[len(old):] if endpoint.startswith(old) else None)
+            return False
+        return r.status_code == 200
 
-    def assignState(self):
-        xmlroot = self.retrieveData()
-        if "Error" in xmlroot.tag:
-            error = xmlroot[0].text
-            if error == "NoSuchBucket":
-                if self.checkRateLimit():
-                    self.status = -1
-                else:
-                    self.status = 0                  
-
-            elif error == "AccessDenied":
-                self.status = 1
-
-            elif error == "AllAccessDisabled":
-                self.status = 2
-            
+    def headState(self,status_code=None,headers={}):
+        """
+        PURPOSE: Cheap existence tier, classify the bucket from a HEAD request so the
+                 listing is only fetched for buckets that exist
+        INPUT: (optional) HEAD status code and headers, for callers that have already
+               made the request themselves
+        RETURN: True if the bucket exists and assignState should run
+        """
+        if status_code is None:
+            r = self.send("HEAD",self.url,stage=PROBE,kind="head",headers=self.headers)
+            status_code, headers = r.status_code, r.headers
+        # a redirected HEAD still names the region, so the next request goes there directly
+        self.setRegion(redirectRegion(headers))
+        status = classify(status_code,headers)
+        if status in (THROTTLED,NONEXISTENT):
+            self.status = status
+            self.checked = True
             return False
+        return True
 
+    def assignState(self,status_code=None,headers={},body=b""):
+        """
+        PURPOSE: Assign a status to the bucket from a single max-keys=1 listing response
+        INPUT: (optional) status code, headers and body of the probe GET, for callers
+               that have already made the request themselves (e.g. the async engine)
+        RETURN: True if the bucket is listable
+        """
+        if status_code is None:
+            r = self.send("GET",self.url+PROBE_PARAMS,stage=PROBE,kind="probe",headers=self.headers)
+            status_code, headers, body = r.status_code, r.headers, r.content
+            # a region and then an addressing style may each cost one redirect
+            for _ in range(2):
+                if errorCode(body) not in REDIRECTS or not self.reroute(headers,body):
+                    break
+                r = self.send("GET",self.url+PROBE_PARAMS,stage=PROBE,kind="probe",headers=self.headers)
+                status_code, headers, body = r.status_code, r.headers, r.content
         else:
-            self.status = 3
-            return True
+            self.reroute(headers,body)
+        self.status = classify(status_code,headers,body)
+        self.checked = True
+        if self.status == LISTABLE:
+            self.firstObject = self.parseFirstObject(body)
+        return self.status == LISTABLE
 
-    def enumContent(self):
+    @staticmethod
+    def parseFirstObject(body):
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError:
+            return None
+        for child in root:
+            if localname(child.tag) == "Contents":
+                return Bucket.objectRecord(child)
+        return None
+
+    def testURL(self):
         """
-        PURPOSE: List and assign content to a bucket object
+        PURPOSE: URL of the first object, found by the listability probe
         INPUT: Bucket object
         RETURN: URL to test for readability
         """
-        r = self.retrieveData(True)
-        root = ET.fromstring(r.text)
-        linefmt = "\t{}\t{}\t{}\t\t{}\t{}\n"
-        files = ""
-        counter = 1
-        testfileURL = ""
-        default = self.url
-        
-        for child in root:
-            if child.tag.split("}")[1].lower() == "contents":
-                filename = child[0].text
-                if testfileURL == "":
-                    testfileURL = self.url+filename if filename != "" else default
-                modified = child[1].text
+        if self.firstObject and self.firstObject['key'] != "":
+            return self.url+self.firstObject['key']
+        return self.url
+
+    def listStream(self,budget,prefix="",startAfter="",delimiter="",pages=None,maxKeys=None):
+        """
+        PURPOSE: Stream ListObjectsV2 pages, following continuation tokens
+        INPUT: ListingBudget, (optional) prefix, key to start after, delimiter, most
+               pages to fetch and keys per page
+        RETURN: generator of ("object", record), ("prefix", common prefix) and, if the
+                page limit stopped a truncated listing, a final ("more", token)
+        DOCS:
+        |__ Each page is read in chunks and fed to a pull parser, so a record is yielded as
+        |__ soon as its <Contents> closes and is then cleared. Memory stays constant no matter
+        |__ how many keys the bucket holds.
+        """
+        token = None
+        page = 0
+        while not budget.exhausted:
+            params = "?list-type=2&fetch-owner=true"
+            if prefix:
+                params += "&prefix=" + quote(prefix,safe="")
+            if delimiter:
+                params += "&delimiter=" + quote(delimiter,safe="")
+            if maxKeys:
+                params += "&max-keys={}".format(maxKeys)
+            if token:
+                params += "&continuation-token=" + quote(token,safe="")
+            elif startAfter:
+                params += "&start-after=" + quote(startAfter,safe="")
+            r = self.send("GET",self.url+params,kind="list",headers=self.headers,stream=True)
+            if isThrottled(r.status_code):
+                # the bucket is retried, a partial listing would pass for a complete one
+                r.close()
+                self.status = THROTTLED
+                return
+            parser = ET.XMLPullParser(events=("end",))
+            token = None
+            received = 0
+            try:
+                for chunk in r.iter_content(CHUNK):
+                    received += len(chunk)
+                    parser.feed(chunk)
+                    for event, elem in parser.read_events():
+                        tag = localname(elem.tag)
+                        if tag == "Contents":
+                            yield "object", self.objectRecord(elem)
+                            elem.clear()
+                            if not budget.spend(objects=1):
+                                return
+                        elif tag == "CommonPrefixes":
+                            yield "prefix", elem[0].text
+                            elem.clear()
+                        elif tag == "NextContinuationToken":
+                            token = elem.text
+                    if not budget.spend(received=len(chunk)):
+                        return
+            finally:
+                r.close()
+                self.transport.metrics.addBytes("list",r.status_code,received)
+            page += 1
+            if not token:
+                return
+            if pages and page >= pages:
+                yield "more", token
+                return
+
+    def listObjects(self,maxObjects=MAX_OBJECTS,maxBytes=MAX_BYTES,maxSeconds=MAX_SECONDS):
+        """
+        PURPOSE: Stream the bucket's objects one page after another
+        INPUT: Caps on objects listed, response bytes read and seconds spent
+        RETURN: generator of object records {key, modified, owner, size}
+        """
+        budget = ListingBudget(maxObjects,maxBytes,maxSeconds)
+        self.objects = 0
+        self.truncated = False
+        for kind, record in self.listStream(budget):
+            if kind == "object":
+                self.objects += 1
+                yield record
+        self.truncated = budget.exhausted
+
+    def deepListObjects(self,executor,maxObjects=MAX_OBJECTS,maxBytes=MAX_BYTES,maxSeconds=MAX_SECONDS):
+        """
+        PURPOSE: List a large open bucket with its prefixes partitioned across an executor
+        INPUT: Executor running the partitions, caps shared by all partitions
+        RETURN: generator of object records, merged from every partition as they arrive
+        DOCS:
+        |__ A partition (prefix, start-after key, depth) fetches one flat page. If the page is
+        |__ not truncated the prefix is done, so small buckets cost a single request. A hot
+        |__ prefix lists the rest of itself with delimiter=/ after the last key it emitted,
+        |__ and each common prefix found becomes a new partition, up to SPLIT_DEPTH levels
+        |__ deep. Deeper partitions page through the rest sequentially.
+        """
+        budget = ListingBudget(maxObjects,maxBytes,maxSeconds)
+        results = queue.Queue(maxsize=LISTING_QUEUE)
+
+        def emit(item):
+            while not budget.exhausted:
                 try:
-                    owner = child[5][1].text
-                except:
-                    owner = ""
-                size = child[3].text
-                files += linefmt.format(counter,modified,owner,size,filename)
-                counter += 1
+                    results.put(item,timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
 
-        self.content = (files if files.strip() != "\n" else None)
-        testfileURL = default if testfileURL == "" else testfileURL
-        return testfileURL
+        def partition(prefix,startAfter,depth):
+            try:
+                children = []
+                last = startAfter
+                more = None
+                pages = 1 if depth < SPLIT_DEPTH else None
+                for kind, value in self.listStream(budget,prefix,startAfter,pages=pages):
+                    if kind == "object":
+                        emit(("object",value))
+                        last = value['key']
+                    elif kind == "more":
+                        more = value
+                if more:
+                    # hot prefix: split the rest of it by its next path level
+                    for kind, value in self.listStream(budget,prefix,last,delimiter="/"):
+                        if kind == "object":
+                            emit(("object",value))
+                        elif kind == "prefix":
+                            children.append(value)
+                emit(("done",children,last,depth))
+            except Exception as e:
+                emit(("error",e))
+
+        self.objects = 0
+        self.truncated = False
+        running = 1
+        executor.submit(partition,"","",0)
+        try:
+            while running and not budget.exhausted:
+                try:
+                    item = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item[0] == "object":
+                    self.objects += 1
+                    yield item[1]
+                elif item[0] == "done":
+                    kind, children, last, depth = item
+                    running += len(children) - 1
+                    for child in children:
+                        executor.submit(partition,child,last,depth+1)
+                else:
+                    raise item[1]
+            # drain what finished partitions already emitted
+            while not results.empty() and self.objects < maxObjects:
+                item = results.get_nowait()
+                if item[0] == "object":
+                    self.objects += 1
+                    yield item[1]
+        finally:
+            self.truncated = budget.exhausted
+            budget.exhausted = True # stop any partition still running
+
+    @staticmethod
+    def objectRecord(elem):
+        record = {"key":"","modified":"","owner":"","size":""}
+        for child in elem:
+            tag = localname(child.tag)
+            if tag == "Key":
+                record['key'] = child.text or ""
+            elif tag == "LastModified":
+                record['modified'] = child.text
+            elif tag == "Size":
+                record['size'] = child.text
+            elif tag == "Owner":
+                for field in child:
+                    if localname(field.tag) == "DisplayName":
+                        record['owner'] = field.text or ""
+        return record
+
+    @staticmethod
+    def formatObject(counter,record):
+        return "\t{}\t{}\t{}\t\t{}\t{}\n".format(
+            counter,record['modified'],record['owner'],record['size'],record['key']
+        )
+
+    def enumContent(self,sink=None,maxObjects=MAX_OBJECTS,maxBytes=MAX_BYTES,maxSeconds=MAX_SECONDS,executor=None):
+        """
+        PURPOSE: List and assign content to a bucket object
+        INPUT: Bucket object, (optional) sink called with (counter, record) for each object
+               as it arrives, caps on objects, bytes and seconds spent listing, executor for
+               prefix-partitioned deep listing
+        RETURN: URL to test for readability
+        """
+        if executor:
+            records = self.deepListObjects(executor,maxObjects,maxBytes,maxSeconds)
+        else:
+            records = self.listObjects(maxObjects,maxBytes,maxSeconds)
+        lines = []
+        testfileURL = ""
+        for counter, record in enumerate(records,1):
+            if testfileURL == "":
+                testfileURL = self.url+record['key'] if record['key'] != "" else self.url
+            if sink:
+                sink(counter,record)
+            else:
+                lines.append(self.formatObject(counter,record))
+
+        if not sink:
+            self.content = "".join(lines)
+        return testfileURL if testfileURL else self.url
+
+    def getSubresource(self,name):
+        """
+        PURPOSE: Fetch one bucket subresource (?acl, ?policy, ...)
+        INPUT: Subresource name
+        RETURN: (error code or None, formatted content or None), a throttled request also
+                sets the status to THROTTLED
+        """
+        r = self.retrieveData(True,"?"+name)
+        code = errorCode(r.content)
+        if isThrottled(r.status_code,r.content):
+            self.status = THROTTLED
+            return code, None
+        if code is not None:
+            return code, None
+        try:
+            return None, xml_prettyprint(ET.fromstring(r.content))
+        except ET.ParseError:
+            # ?policy answers with a JSON document
+            return None, r.text
 
     def get_acl(self):
-        xmlroot = self.retrieveData(params="?acl")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("acl")[1]
 
     def get_accelerate(self):
-        xmlroot = self.retrieveData(params="?accelerate")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("accelerate")[1]
 
     def get_cors(self):
-        xmlroot = self.retrieveData(params="?cors")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("cors")[1]
 
     def get_encryption(self):
-        xmlroot = self.retrieveData(params="?encryption")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("encryption")[1]
 
     def get_location(self):
-        xmlroot = self.retrieveData(params="?location")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("location")[1]
 
     def get_logging(self):
-        xmlroot = self.retrieveData(params="?logging")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("logging")[1]
 
     def get_policy(self):
-        xmlroot = self.retrieveData(params="?policy")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("policy")[1]
 
     def get_replication(self):
-        xmlroot = self.retrieveData(params="?replication")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
+        return self.getSubresource("replication")[1]
 
     def get_website(self):
-        xmlroot = self.retrieveData(params="?website")
-        return None if "Error" in xmlroot.tag else xml_prettyprint(xmlroot)
-
-    def metadata(self):
-        content = {
-            "acl":self.get_acl(),
-            "accelerate":self.get_accelerate(),
-            "cors":self.get_cors(),
-            "encryption":self.get_encryption(),
-            "location":self.get_location(),
-            "logging":self.get_logging(),
-            "policy":self.get_policy(),
-            "replication":self.get_replication(),
-            "website":self.get_website()
-        }
+        return self.getSubresource("website")[1]
+
+    def metadata(self,subresources=SUBRESOURCES,executor=None):
+        """
+        PURPOSE: Collect the selected subresources for the bucket
+        INPUT: List of subresource names, (optional) executor to fetch them concurrently
+        RETURN: Formatted metadata string
+        DOCS:
+        |__ The first subresource is fetched alone. If it comes back AccessDenied the rest
+        |__ almost always do too, so they are skipped. Otherwise the rest are fanned out
+        |__ over the executor at once. Nothing more is fetched once one is throttled.
+        """
+        if not subresources:
+            return ""
+        first, rest = subresources[0], subresources[1:]
+        code, content = self.getSubresource(first)
+        results = {first:content}
+        if code != b"AccessDenied" and rest and self.status != THROTTLED:
+            fetched = executor.map(self.getSubresource,rest) if executor else map(self.getSubresource,rest)
+            for name, (code, content) in zip(rest,fetched):
+                results[name] = content
+
         output = ""
-        output += "[+] ACL\n{}".format(content['acl']) if content['acl'] else ""
-        output += "[+] Accelerate\n{}".format(content['accelerate']) if content['accelerate'] else ""
-        output += "[+] CORS\n{}".format(content['cors']) if content['cors'] else ""
-        output += "[+] Encryption\n{}".format(content['encryption']) if content['encryption'] else ""
-        output += "[+] Location\n{}".format(content['location']) if content['location'] else ""
-        output += "[+] Logging\n{}".format(content['logging']) if content['logging'] else ""
-        output += "[+] Policy\n{}".format(content['policy']) if content['policy'] else ""
-        output += "[+] Replication\n{}".format(content['replication']) if content['replication'] else ""
-        output += "[+] Website\n{}".format(content['website']) if content['website'] else ""
-
-        return output
\ No newline at end of file
+        for name in SUBRESOURCES:
+            if results.get(name):
+                output += "[+] {}\n{}".format(TITLES[name],results[name])
+        return output
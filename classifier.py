@@ -0,0 +1,117 @@
+#/usr/bin/env python3
+import json
+import sys
+from pathlib import Path
+
+# GLOBALS
+# Bucket statuses, see the Bucket docstring
+THROTTLED = -1
+NONEXISTENT = 0
+DENIED = 1
+DISABLED = 2
+LISTABLE = 3
+READABLE = 4
+WRITEABLE = 5
+
+# Kinds of request a response can answer
+BUCKET = "bucket" # HEAD or GET on the bucket root
+OBJECT = "object" # GET or HEAD on an object in the bucket
+WRITE = "write"   # PUT of a test object
+
+ERROR_CODES = {
+    b"NoSuchBucket":NONEXISTENT,
+    b"InvalidBucketName":NONEXISTENT,
+    b"AccessDenied":DENIED,
+    b"AllAccessDisabled":DISABLED,
+    b"SlowDown":THROTTLED,
+    b"ServiceUnavailable":THROTTLED,
+    b"Throttling":THROTTLED,
+    b"TooManyRequests":THROTTLED,
+    b"RequestLimitExceeded":THROTTLED,
+    # the bucket exists, but answers from another region's endpoint
+    b"PermanentRedirect":DENIED,
+    b"TemporaryRedirect":DENIED,
+}
+THROTTLE_STATUS = (429,503)
+FIXTURES = Path(__file__).parent / "fixtures" / "responses"
+
+# HELPERS
+def errorCode(body):
+    """
+    PURPOSE: Pull the <Code> out of an S3 error body without decoding or parsing it
+    INPUT: Response body as bytes
+    RETURN: Error code as bytes, or None if the body is not an error
+    """
+    start = body.find(b"<Code>",0,512)
+    if start == -1:
+        return None
+    start += 6
+    end = body.find(b"</Code>",start)
+    return body[start:end] if end != -1 else None
+
+def isThrottled(status_code,body=b""):
+    """
+    PURPOSE: Tell whether S3 throttled a request, whatever kind of request it was
+    INPUT: HTTP status code, body bytes (empty for HEAD or an unread body)
+    RETURN: True for 429/503 or a throttling error code
+    """
+    if status_code in THROTTLE_STATUS:
+        return True
+    code = errorCode(body) if body else None
+    return code is not None and ERROR_CODES.get(code) == THROTTLED
+
+def classify(status_code,headers={},body=b"",kind=BUCKET):
+    """
+    PURPOSE: Map a single S3 response to a bucket status
+    INPUT: HTTP status code, response headers, body bytes (empty for HEAD), kind of request
+    RETURN: Status from -1 to 5
+    """
+    if isThrottled(status_code,body):
+        return THROTTLED
+    code = errorCode(body) if body else None
+
+    # object and write checks only ever raise a listable bucket's status
+    if kind == OBJECT:
+        # 416 - an empty object can't satisfy bytes=0-0, but we were allowed to read it
+        return READABLE if status_code in (200,206,416) else LISTABLE
+    if kind == WRITE:
+        return WRITEABLE if status_code == 200 else LISTABLE
+
+    if code in ERROR_CODES:
+        return ERROR_CODES[code]
+    if status_code == 200:
+        return LISTABLE
+    if status_code == 404:
+        return NONEXISTENT
+    # 403 from a HEAD can't tell denied from disabled, a GET refines it.
+    # 301/307/400 without a body mean the bucket lives in another region.
+    return DENIED
+
+def checkFixtures(path=FIXTURES):
+    """
+    PURPOSE: Classify the recorded S3 responses in the fixture corpus offline
+    INPUT: Path to the corpus directory containing index.json
+    RETURN: List of (fixture, expected, actual) for every mismatch
+    """
+    with open(Path(path,"index.json"),"r") as f:
+        index = json.load(f)
+    failures = []
+    for case in index:
+        body = Path(path,case['body']).read_bytes() if case.get('body') else b""
+        actual = classify(
+            case['status_code'],
+            case.get('headers',{}),
+            body,
+            case.get('kind',BUCKET)
+        )
+        if actual != case['expected']:
+            failures.append((case['name'],case['expected'],actual))
+    return failures
+
+
+if __name__ == "__main__":
+    failures = checkFixtures()
+    for name, expected, actual in failures:
+        print("[CLASSIFIER] {} -- expected {}, got {}".format(name,expected,actual))
+    print("[CLASSIFIER] {} mismatches".format(len(failures)))
+    sys.exit(1 if failures else 0)
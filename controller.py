@@ -0,0 +1,133 @@
+#/usr/bin/env python3
+import asyncio
+import threading
+import time
+from collections import deque
+
+# GLOBALS
+DECREASE = 0.5 # multiplicative decrease on throttling
+INCREASE = 1   # additive increase per clean window
+PAUSE = 1.0    # seconds to hold new probes after throttling
+POLL = 0.01    # seconds a waiting thread sleeps between checks of a full limit
+
+class ConcurrencyController:
+    """
+    PURPOSE: AIMD control of in-flight probes, backing off on S3 throttling
+    INPUT: Maximum number of in-flight probes, seconds to pause after throttling
+    DOCS:
+    |__[ATTR] LIMIT
+    |_____ Current number of probes allowed in flight, between 1 and the maximum
+    |__[ATTR] WINDOW
+    |_____ Probes finished since the last change. A full window (LIMIT probes) with no
+    |_____ throttling grows LIMIT by INCREASE, any throttled probe cuts it by DECREASE
+    |_____ and holds new probes for PAUSE seconds.
+    |__[ATTR] STATS
+    |_____ throttled: candidates throttled, by the probe or any later check
+    |_____ decreases, increases: limit changes made
+    |_____ lowest: smallest limit reached during the run
+    |__[ATTR] WAITERS
+    |_____ (loop, future) of each async task waiting for a slot, oldest first. release
+    |_____ resolves one per free slot, so waiting tasks sleep instead of polling.
+    |__[FUNC] acquire / acquireAsync, release
+    """
+
+    def __init__(self,maximum,pause=PAUSE):
+        self.maximum = max(1,maximum)
+        self.limit = self.maximum
+        self.pause = pause
+        self.inflight = 0
+        self.window = 0
+        self.resume = 0
+        self.cond = threading.Condition()
+        self.waiters = deque()
+        self.stats = {
+            "throttled":0,
+            "decreases":0,
+            "increases":0,
+            "lowest":self.limit
+        }
+
+    def wait(self):
+        """
+        PURPOSE: Take a slot if one is free
+        INPUT: Self (caller holds self.cond)
+        RETURN: None if a slot was taken, 0 if every slot is taken (wait for a release),
+                otherwise seconds left in the pause
+        """
+        delay = self.resume - time.monotonic()
+        if delay > 0:
+            return delay
+        if self.inflight >= self.limit:
+            return 0
+        self.inflight += 1
+        return None
+
+    def wake(self):
+        # caller holds self.cond, hands each free slot to the task waiting longest
+        free = self.limit - self.inflight
+        while free > 0 and self.waiters:
+            loop, future = self.waiters.popleft()
+            loop.call_soon_threadsafe(self.resolve,future)
+            free -= 1
+
+    @staticmethod
+    def resolve(future):
+        if not future.done():
+            future.set_result(None)
+
+    def acquire(self):
+        with self.cond:
+            delay = self.wait()
+            while delay is not None:
+                self.cond.wait(delay or POLL)
+                delay = self.wait()
+
+    async def acquireAsync(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                delay = self.wait()
+                if delay == 0:
+                    future = loop.create_future()
+                    self.waiters.append((loop,future))
+            if delay is None:
+                return
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self.cond:
+                    try:
+                        self.waiters.remove((loop,future))
+                    except ValueError:
+                        self.wake() # it was handed a slot, pass it on
+                raise
+
+    def release(self,throttled=False):
+        """
+        PURPOSE: Free a slot and adjust the limit from the candidate's outcome
+        INPUT: True if the probe or any later check (listing, readability, write,
+               metadata) was throttled, the candidate is then requeued
+        RETURN: None
+        """
+        with self.cond:
+            self.inflight -= 1
+            if throttled:
+                self.stats['throttled'] += 1
+                # only back off once per pause, a burst of 503s is one signal
+                if self.resume <= time.monotonic():
+                    self.limit = max(1,int(self.limit * DECREASE))
+                    self.stats['decreases'] += 1
+                    self.stats['lowest'] = min(self.stats['lowest'],self.limit)
+                    self.resume = time.monotonic() + self.pause
+                self.window = 0
+            else:
+                self.window += 1
+                if self.window >= self.limit and self.limit < self.maximum:
+                    self.limit = min(self.maximum,self.limit + INCREASE)
+                    self.stats['increases'] += 1
+                    self.window = 0
+            self.wake()
+            self.cond.notify_all()
@@ -0,0 +1,466 @@
+#/usr/bin/env python3
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+
+import requests
+
+from sinks import bucketRecord
+
+# GLOBALS
+PORT = 8642
+LEASE_SIZE = 200 # candidates handed out per lease
+LEASE_TTL = 30   # seconds a lease lives without a sync from its worker
+HEARTBEAT = 2    # seconds between worker syncs
+TIMEOUT = 10     # seconds a worker waits for the coordinator
+
+# HELPERS
+def parseAddress(address,port=PORT):
+    """
+    PURPOSE: Split "host:port", "port" or "host" into a (host, port) tuple
+    INPUT: Address string, default port
+    RETURN: (host, port)
+    """
+    host, sep, number = address.rpartition(":")
+    if not sep:
+        return (address or "127.0.0.1",port) if not address.isdigit() else ("127.0.0.1",int(address))
+    return host or "127.0.0.1", int(number)
+
+class Lease:
+    """
+    PURPOSE: A batch of candidates held by one worker
+    DOCS:
+    |__[ATTR] ORDER - names in the order the worker probes them
+    |__[ATTR] REMAINING - names not reported done yet
+    |__[ATTR] PENDING - names at the end of ORDER the worker has not started, as of its last sync
+    |__[ATTR] REVOKING - names asked back from the worker, until it answers
+    """
+
+    def __init__(self,lease,worker,names,ttl):
+        self.id = lease
+        self.worker = worker
+        self.order = list(names)
+        self.remaining = set(names)
+        self.pending = len(names)
+        self.revoking = []
+        self.deadline = time.monotonic() + ttl
+
+class Coordinator:
+    """
+    PURPOSE: Hand out candidates from a Hunter to remote workers and gather their results
+    INPUT: Hunter (only its candidate stream is used), logger, candidates per lease,
+           seconds a silent worker keeps its leases
+    DOCS:
+    |__ Workers POST /sync every HEARTBEAT seconds, and whenever they run out of work. A
+    |__ sync reports names finished, names not yet started, findings and cumulative
+    |__ counters, and may ask for a new lease. Nothing is pushed to a worker, so workers
+    |__ can come and go.
+    |__[ATTR] POOL
+    |_____ Names from expired leases, handed out again before new candidates
+    |__[ATTR] STEALING
+    |_____ Once every candidate is leased, an idle worker asks for the unstarted half of
+    |_____ the busiest lease. Its owner is told on its next sync, and hands back the names
+    |_____ it has not started by then, which go to the POOL.
+    |__[ATTR] RECORDS
+    |_____ Findings by bucket name, so a name probed twice is only reported once
+    |__[FUNC] sync - one worker round trip
+    |__[FUNC] serve - run until every candidate is done and every worker has left
+    """
+
+    def __init__(self,hunter,logger,leaseSize=LEASE_SIZE,ttl=LEASE_TTL):
+        self.hunter = hunter
+        self.logger = logger
+        self.leaseSize = leaseSize
+        self.ttl = ttl
+        self.names = hunter.candidates()
+        self.exhausted = False
+        self.pool = deque()
+        self.leases = {}
+        self.ids = count(1)
+        self.revoked = {}
+        self.workers = {}
+        self.records = {}
+        self.lock = threading.Lock()
+        self.stats = {"leases":0,"expired":0,"stolen":0}
+
+    def take(self,size):
+        names = []
+        while self.pool and len(names) < size:
+            names.append(self.pool.popleft())
+        while not self.exhausted and len(names) < size:
+            try:
+                names.append(next(self.names))
+            except StopIteration:
+                self.exhausted = True
+        return names
+
+    def steal(self,worker):
+        """
+        PURPOSE: Ask the worker holding the busiest lease to hand back its unstarted half
+        INPUT: Worker asking for work
+        RETURN: None, the names reach the POOL once the owner answers
+        """
+        victims = [
+            l for l in self.leases.values()
+            if l.worker != worker and l.pending > 1 and not l.revoking
+        ]
+        if not victims:
+            return
+        victim = max(victims,key=lambda l: l.pending)
+        victim.revoking = victim.order[-(victim.pending // 2):]
+        self.revoked.setdefault(victim.worker,{})[victim.id] = victim.revoking
+        self.logger.log("COORDINATOR","INFO","{} asked for {} names of lease {} of {}".format(
+            worker,len(victim.revoking),victim.id,victim.worker
+        ))
+
+    def reclaim(self,lease,names):
+        # caller holds the lock, names were handed back unstarted
+        names = [name for name in names if name in lease.remaining]
+        lease.remaining.difference_update(names)
+        dropped = set(names)
+        lease.order = [name for name in lease.order if name not in dropped]
+        lease.revoking = []
+        self.pool.extend(names)
+        self.stats['stolen'] += len(names)
+
+    def expire(self):
+        now = time.monotonic()
+        with self.lock:
+            for lease in [l for l in self.leases.values() if l.deadline < now]:
+                del self.leases[lease.id]
+                names = [name for name in lease.order if name in lease.remaining]
+                self.pool.extendleft(reversed(names))
+                self.stats['expired'] += 1
+                self.logger.log("COORDINATOR","WARN","Lease {} of {} expired, re-issuing {} names".format(
+                    lease.id,lease.worker,len(names)
+                ))
+
+    @property
+    def finished(self):
+        return self.exhausted and not self.pool and not self.leases
+
+    def sync(self,message):
+        """
+        PURPOSE: Apply one worker's report and answer it
+        INPUT: dict with worker, want, done {lease: [names]}, pending {lease: count},
+               released {lease: [names]}, records, counters, metrics, final (the worker is leaving)
+        RETURN: dict with leases [{id, names}], revoke {lease: [names]}, finished
+        """
+        worker = message['worker']
+        with self.lock:
+            state = self.workers.setdefault(worker,{"counters":{},"metrics":None,"left":False})
+            if message.get('counters'):
+                state['counters'] = message['counters']
+            if message.get('metrics'):
+                state['metrics'] = message['metrics']
+            for record in message.get('records',[]):
+                self.records[record['name']] = record
+            for lease, names in message.get('done',{}).items():
+                lease = self.leases.get(int(lease))
+                if lease and lease.worker == worker:
+                    lease.remaining.difference_update(names)
+                if self.hunter.scheduler:
+                    # every finding is reported in records, by this sync at the latest
+                    for name in names:
+                        self.hunter.scheduler.done(name,name in self.records)
+            for lease, names in message.get('released',{}).items():
+                lease = self.leases.get(int(lease))
+                if lease and lease.worker == worker:
+                    self.reclaim(lease,names)
+            for lease, pending in message.get('pending',{}).items():
+                lease = self.leases.get(int(lease))
+                if lease and lease.worker == worker:
+                    lease.pending = min(pending,len(lease.order))
+            deadline = time.monotonic() + self.ttl
+            for lease in list(self.leases.values()):
+                if lease.worker == worker:
+                    lease.deadline = deadline
+                    if not lease.remaining:
+                        del self.leases[lease.id]
+
+            leases = []
+            if message.get('want'):
+                names = self.take(message['want'])
+                if not names:
+                    self.steal(worker)
+                    # the pool may already hold names released by this very sync
+                    names = self.take(message['want'])
+                if names:
+                    lease = Lease(next(self.ids),worker,names,self.ttl)
+                    self.leases[lease.id] = lease
+                    self.stats['leases'] += 1
+                    leases.append({"id":lease.id,"names":names})
+            finished = self.finished
+            state['left'] = bool(message.get('final'))
+            return {
+                "leases":leases,
+                "revoke":self.revoked.pop(worker,{}),
+                "finished":finished
+            }
+
+    def status(self):
+        with self.lock:
+            return {
+                "workers":len(self.workers),
+                "leases":len(self.leases),
+                "pool":len(self.pool),
+                "exhausted":self.exhausted,
+                "findings":len(self.records),
+                **self.stats
+            }
+
+    def serve(self,address):
+        """
+        PURPOSE: Answer workers until the hunt is finished
+        INPUT: (host, port) to listen on
+        RETURN: None
+        """
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self,format,*args):
+                pass
+
+            def reply(self,body):
+                body = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type","application/json")
+                self.send_header("Content-Length",str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.reply(coordinator.status())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.reply(coordinator.sync(json.loads(self.rfile.read(length))))
+
+        server = ThreadingHTTPServer(address,Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever,daemon=True).start()
+        self.logger.log("COORDINATOR","STAT","Waiting for workers on {}:{}".format(*server.server_address[:2]))
+        try:
+            quiet = None
+            while True:
+                time.sleep(0.5)
+                self.expire()
+                if not self.finished:
+                    continue
+                # wait for every worker's final report, or for the silent ones to time out
+                quiet = quiet or time.monotonic()
+                left = all(state['left'] for state in self.workers.values())
+                if left or time.monotonic() - quiet > self.ttl:
+                    break
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def counters(self):
+        """
+        PURPOSE: Sum the workers' counters with the coordinator's own candidate counts
+        INPUT: Self
+        RETURN: dict of counter name to value
+        """
+        counts = dict.fromkeys(self.hunter.counters(),0)
+        for state in self.workers.values():
+            for key, value in state['counters'].items():
+                counts[key] = counts.get(key,0) + value
+        for key in ("candidates","duplicate","invalid","other_shard"):
+            counts[key] = self.hunter.filter.stats[key]
+        counts['cached'] = self.hunter.store.stats['skipped'] if self.hunter.store else 0
+        return counts
+
+    def findings(self):
+        """
+        PURPOSE: Every finding, with cached ones restored by the coordinator's candidate stream
+        INPUT: Self
+        RETURN: List of result records
+        """
+        records = dict(self.records)
+        for name, bucket in self.hunter.buckets.items():
+            records.setdefault(name,bucketRecord(bucket))
+        return list(records.values())
+
+class WorkerClient:
+    """
+    PURPOSE: Feed a Hunter with leased candidates and report back to the coordinator
+    INPUT: Coordinator (host, port), Hunter, logger, candidates to ask for per lease
+    DOCS:
+    |__ Plugged into the Hunter as its candidate source, its result sink and its tracker,
+    |__ so the hunt itself runs unchanged. A background thread syncs every HEARTBEAT
+    |__ seconds, which keeps the leases alive and delivers findings as they are found.
+    |__[FUNC] stream - candidate generator for one Hunter.hunt round
+    |__[FUNC] done - tracker hook, a candidate's work is final
+    |__[FUNC] write - sink hook, a finding
+    |__[FUNC] run - hunt rounds until the coordinator reports the hunt finished
+    """
+
+    def __init__(self,address,hunter,logger,leaseSize=LEASE_SIZE):
+        self.url = "http://{}:{}/sync".format(*address)
+        self.hunter = hunter
+        self.logger = logger
+        self.leaseSize = leaseSize
+        self.worker = "{}-{}".format(socket.gethostname(),os.getpid())
+        self.leases = {} # lease -> deque of names not started
+        self.owner = {}  # name -> lease, until it is done
+        self.outstanding = {} # lease -> names not done
+        self.finishedNames = {}
+        self.releasedNames = {} # lease -> names handed back unstarted
+        self.records = []
+        self.finished = False
+        self.contact = time.monotonic()
+        self.written = 0
+        self.path = "coordinator"
+        self.lock = threading.Lock()
+        self.syncLock = threading.Lock()
+        self.session = requests.Session()
+        self.stop = threading.Event()
+
+    def sync(self,want=0,final=False):
+        """
+        PURPOSE: One round trip to the coordinator
+        INPUT: Candidates wanted, whether this is the last sync (sends metrics too)
+        RETURN: Coordinator reply, or None if it could not be reached
+        """
+        with self.syncLock:
+            with self.lock:
+                done, self.finishedNames = self.finishedNames, {}
+                released, self.releasedNames = self.releasedNames, {}
+                records, self.records = self.records, []
+                pending = {lease:len(names) for lease, names in self.leases.items()}
+            message = {
+                "worker":self.worker,
+                "want":want,
+                "done":done,
+                "pending":pending,
+                "released":released,
+                "records":records,
+                "counters":self.hunter.counters(),
+                "final":final
+            }
+            if final or want:
+                message['metrics'] = self.hunter.transport.metrics.summary()
+            try:
+                r = self.session.post(self.url,json=message,timeout=TIMEOUT)
+                r.raise_for_status()
+                reply = r.json()
+            except (requests.exceptions.RequestException,ValueError) as e:
+                self.logger.log("WORKER","WARN","Coordinator unreachable: {}".format(e))
+                with self.lock:
+                    # keep the reports for the next sync
+                    for lease, names in done.items():
+                        self.finishedNames.setdefault(lease,[]).extend(names)
+                    for lease, names in released.items():
+                        self.releasedNames.setdefault(lease,[]).extend(names)
+                    self.records.extend(records)
+                return None
+            self.contact = time.monotonic()
+            with self.lock:
+                for lease, names in reply.get('revoke',{}).items():
+                    lease = int(lease)
+                    asked = set(names)
+                    queued = self.leases.get(lease,deque())
+                    # only names not started yet go back, the rest are finished here
+                    dropped = [name for name in queued if name in asked]
+                    self.releasedNames.setdefault(lease,[]).extend(dropped)
+                    if dropped:
+                        self.leases[lease] = deque(name for name in queued if name not in asked)
+                    for name in dropped:
+                        del self.owner[name]
+                        self.release(lease)
+                for lease in reply.get('leases',[]):
+                    self.leases[lease['id']] = deque(lease['names'])
+                    self.outstanding[lease['id']] = len(lease['names'])
+                    for name in lease['names']:
+                        self.owner[name] = lease['id']
+                self.finished = reply.get('finished',False)
+            return reply
+
+    def release(self,lease):
+        # caller holds the lock
+        self.outstanding[lease] -= 1
+        if not self.outstanding[lease]:
+            del self.outstanding[lease]
+            self.leases.pop(lease,None)
+
+    def available(self):
+        with self.lock:
+            return any(self.leases.values())
+
+    def next(self):
+        with self.lock:
+            for names in self.leases.values():
+                if names:
+                    return names.popleft()
+            return None
+
+    def stream(self):
+        while True:
+            name = self.next()
+            if name is not None:
+                yield name
+                continue
+            reply = self.sync(want=self.leaseSize)
+            if not reply or not reply['leases']:
+                return
+
+    def done(self,name):
+        with self.lock:
+            lease = self.owner.pop(name,None)
+            if lease is None:
+                return
+            self.finishedNames.setdefault(lease,[]).append(name)
+            self.release(lease)
+
+    def write(self,record):
+        with self.lock:
+            self.records.append(record)
+            self.written += 1
+
+    def close(self):
+        pass
+
+    def heartbeat(self):
+        while not self.stop.wait(HEARTBEAT):
+            self.sync()
+
+    def run(self):
+        """
+        PURPOSE: Hunt leased candidates until the coordinator has nothing left
+        INPUT: Self
+        RETURN: None
+        """
+        self.hunter.source = None
+        self.hunter.tracker = self
+        self.hunter.sinks = list(self.hunter.sinks) + [self]
+        self.logger.log("WORKER","STAT","{} joining coordinator at {}".format(self.worker,self.url))
+        beat = threading.Thread(target=self.heartbeat,daemon=True)
+        beat.start()
+        try:
+            while True:
+                if not self.available():
+                    self.sync(want=self.leaseSize)
+                    if self.finished:
+                        break
+                    if time.monotonic() - self.contact > LEASE_TTL:
+                        self.logger.log("WORKER","ERRO","Lost the coordinator, stopping")
+                        break
+                    if not self.available():
+                        # other workers still hold leases, one may expire or be split
+                        time.sleep(HEARTBEAT)
+                        continue
+                self.hunter.source = self.stream()
+                self.hunter.hunt()
+        finally:
+            self.stop.set()
+            beat.join()
+            self.sync(final=True)
+            self.hunter.source = None
@@ -0,0 +1,52 @@
+#/usr/bin/env python3
+import threading
+
+class ShardedCounter:
+    """
+    PURPOSE: Count events from many threads without a shared lock on the hot path
+    INPUT: Keys that always appear in a snapshot, even at zero
+    DOCS:
+    |__[ATTR] SHARDS
+    |_____ One plain dict per thread that has counted something. Only its own thread
+    |_____ writes to a shard, so incr never locks. Readers add the shards up, the lock
+    |_____ is only taken to register a new shard or copy the list of shards.
+    |__[FUNC] incr - add to a key in the calling thread's shard
+    |__[FUNC] snapshot - merged totals for every key
+    |__[FUNC] counter["key"] - merged total for one key
+    """
+
+    def __init__(self,keys=()):
+        self.keys = list(keys)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+
+    def shard(self):
+        shard = getattr(self.local,"shard",None)
+        if shard is None:
+            shard = dict.fromkeys(self.keys,0)
+            with self.lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+        return shard
+
+    def incr(self,key,amount=1):
+        shard = self.shard()
+        shard[key] = shard.get(key,0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            shards = list(self.shards)
+        totals = dict.fromkeys(self.keys,0)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key,0) + value
+        return totals
+
+    def __getitem__(self,key):
+        with self.lock:
+            shards = list(self.shards)
+        return sum(shard.get(key,0) for shard in shards)
+
+    def __repr__(self):
+        return repr(self.snapshot())
@@ -1,13 +1,112 @@
 #/usr/bin/env python3
-from bucket import Bucket
+from bucket import Bucket, REDIRECTS, SUBRESOURCES, MAX_OBJECTS, MAX_BYTES, MAX_SECONDS, PROBE_PARAMS, ENDPOINT, REGIONAL_ENDPOINT
+from regions import RegionCache
 from fire import FireProx
-import os, sys
+from transport import Transport, PROBE, DEEP, streamReport
+from classifier import errorCode
+from names import CandidateFilter
+from scheduler import PREFIX, SUFFIX
+from controller import ConcurrencyController
+from sinks import bucketRecord
+from counters import ShardedCounter
+from progress import Progress
+import os, sys, time
+import asyncio
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed, thread
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, thread
 
-class RateLimit(Exception):
-    def __init__(self,msg):
-        super().__init__(msg)
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# HELPERS
+def logResults(logger,counts,stages,downloadable,writeable,concurrency=None,rates=None):
+    """
+    PURPOSE: Log the end of hunt report, for one hunt or several merged shards
+    INPUT: Logger, counters as returned by Hunter.counters, metrics summary stages,
+           names of downloadable and writeable buckets, (optional) final/lowest
+           concurrency and request rate report
+    RETURN: None
+    """
+    total = counts['total']
+    try:
+        valid = "{:.2f}".format(100*(
+            (counts['total'] - counts['failed_hit']) / \
+            total
+            )
+        )
+    except ZeroDivisionError:
+        valid = "{:.2f}".format(0)
+    try:
+        accessible = "{:.2f}".format(100*(
+            (counts['open_list']+counts['open_read']+counts['open_write']) / \
+            (counts['total'] - counts['failed_hit'])
+            )
+        )
+    except ZeroDivisionError:
+        accessible = "{:.2f}".format(0)
+    denied = counts['denied']
+    disabled = counts['disabled']
+    listable = counts['open_list']
+    downloads = counts['open_read']
+    writes = counts['open_write']
+    ratelimits = counts['rate_limits']
+    connections = counts['connections_opened']
+    reused = counts['connections_reused']
+    duplicates = counts['duplicate']
+    invalid = counts['invalid']
+    saved = duplicates + invalid
+    cached = counts['cached']
+    throttled = counts['throttled']
+    learned = counts['regions_learned']
+    known = counts['regions_cached']
+    redirects = counts['redirects_saved']
+    virtual = counts['virtual_fallback']
+    streams = ""
+    if counts['h2_requests'] or counts['h1_fallback']:
+        streams = streamReport(
+            counts['h2_requests'],counts['h2_streams'],counts['h2_stalls'],counts['h2_stall_ms'],counts['h1_fallback']
+        )
+    logger.log("HUNTER","STAT","Hunt complete.")
+    logger.log("HUNTER","INFO",f"\nResults:\n" + \
+        f"\tTotal tries: {total}\n" + \
+        f"\tPercent valid: {valid}%\n" + \
+        f"\tPercent of valid & accessible: {accessible}%\n" + \
+        f"\tDenied: {denied}\n" + \
+        f"\tDisabled: {disabled}\n" + \
+        f"\tListable: {listable}\n" + \
+        f"\tDownloadable: {downloads}\n" + \
+        f"\tWriteable: {writes}\n" + \
+        f"\tRate limits hit: {ratelimits}\n" + \
+        f"\tThrottled probes requeued: {throttled}\n" + \
+        (f"\tConcurrency (final/lowest): {concurrency}\n" if concurrency else "") + \
+        (f"\tRequest rate (achieved/allowed): {rates}\n" if rates else "") + \
+        f"\tConnections opened: {connections}\n" + \
+        f"\tConnections reused: {reused}\n" + \
+        (f"\tHTTP/2: {streams}\n" if streams else "") + \
+        f"\tDuplicate candidates skipped: {duplicates}\n" + \
+        f"\tInvalid candidates skipped: {invalid}\n" + \
+        f"\tProbes saved by pre-filter: {saved}\n" + \
+        f"\tSkipped (cached results): {cached}\n" + \
+        f"\tRegions learned: {learned}\n" + \
+        f"\tRegions known before probing: {known}\n" + \
+        f"\tRedirects saved by regional endpoints: {redirects}\n" + \
+        f"\tPath-style buckets moved to virtual-host: {virtual}\n"
+    )
+    logger.log("HUNTER","INFO","Latency by stage (p50/p90/p99/max):{}\n".format("".join(
+        "\n\t{}: {:.0f}/{:.0f}/{:.0f}/{:.0f} ms, {} requests, {} bytes".format(
+            kind,stats['p50']*1000,stats['p90']*1000,stats['p99']*1000,stats['max']*1000,
+            stats['count'],stats['bytes']
+        ) for kind, stats in stages.items()
+    )))
+    logger.log("HUNTER","INFO","Downloadable buckets:{}\n".format("".join(
+        "\n\t"+name for name in downloadable
+    )))
+    logger.log("HUNTER","INFO","Writeable buckets:{}\n".format("".join(
+        "\n\t"+name for name in writeable
+    )))
 
 class Hunter:
     """
@@ -25,14 +124,49 @@ class Hunter:
         self.require_proxy = False
         self.proxy_up = False
         self.threads = 1
+        self.engine = "thread"
+        self.concurrency = 500
+        self.BACKLOG = 4 # queued candidates per thread
+        self.RETRIES = 5 # times a throttled candidate is requeued
+        self.store = None
+        self.sinks = []
+        self.backoff = 1.0
+        self.RATE_INTERVAL = 10 # seconds between live request rate reports
+        self.subresources = list(SUBRESOURCES)
+        self.metaPool = None
+        self.maxObjects = MAX_OBJECTS
+        self.maxBytes = MAX_BYTES
+        self.maxSeconds = MAX_SECONDS
+        self.PREVIEW = 20 # listing lines kept on the bucket for the report
+        self.listContents = False
+        self.sample = 1 # objects checked for readability per open bucket
+        self.deepList = False
+        self.listWorkers = 8
+        self.listPool = None
+        self.lastRate = time.monotonic()
+        self.endpoint = ENDPOINT
+        self.regional = REGIONAL_ENDPOINT # None - never leave self.endpoint
+        self.regions = RegionCache() # shared by every bucket, in memory unless given a path
+        self.fallback = None # (endpoint, regional) virtual-host templates for path-style addressing
+        self.shard = None # (index, count) of the candidate space this process probes
+        self.source = None # candidates handed in from outside (e.g. a coordinator) instead of the wordlists
+        self.tracker = None # told when a candidate's work is final, see finish
+        self.reported = set()
+        self.scheduler = None # CandidateScheduler, None - wordlist order
+        self.maxRequests = 0 # requests sent (answered or not) before no new candidates are queued, 0 - unlimited
+        self.progress = 0 # seconds between progress line redraws, 0 - off
+        self.metricsPath = None # prefix for the .json and .prom metrics exports
+        self.metricsInterval = 0 # seconds between metrics exports while hunting, 0 - at the end only
 
-        # begin session
-        self.session = requests.session()
+        # pooled HTTP shared by every bucket
+        self.transport = Transport()
 
-        #Open indicated files
+        #Open indicated files, none are needed when candidates come from a source
+        self.modifiers = []
         try:
-            with open(modifiers, "r") as modsFile:
-                self.modifiers = [line.strip() for line in modsFile]
+            if modifiers:
+                with open(modifiers, "r") as modsFile:
+                    self.modifiers = [line.strip() for line in modsFile]
         except FileNotFoundError:
             self.logger.log("HUNTER","ERRO","Modifiers wordlist {} not found.".format(modifiers))
             raise FileNotFoundError
@@ -47,17 +181,21 @@ class Hunter:
         else:
             self.keywords = [keyword]
 
-        self.metadata = {
-            "total":0,
-            "denied":0,
-            "disabled":0,
-            "open_list":0,
-            "open_read":0,
-            "open_write":0,
-            "rate_limits":0,
-            "nonexist":0,
-            "failed_hit":0
-        }
+        # each worker counts into its own shard, merged when read
+        self.metadata = ShardedCounter([
+            "total",
+            "denied",
+            "disabled",
+            "open_list",
+            "open_read",
+            "open_write",
+            "rate_limits",
+            "nonexist",
+            "failed_hit",
+            "queued",
+            "finished",
+            "virtual_fallback"
+        ])
 
         # Determine number of threads
         try:
@@ -70,7 +208,11 @@ class Hunter:
             self.threads = 1
 
         self.buckets = {}
-        self.processes = []
+        self.processes = set()
+        self.retry = deque()
+        self.retries = {}
+        self.controller = ConcurrencyController(self.threads,self.backoff)
+        self.filter = CandidateFilter(self.BADCHARS)
 
         self.fp = FireProx()
 
@@ -93,14 +235,67 @@ class Hunter:
 
     def doRateLimitAvoid(self,lastBucket):
         """
-        PURPOSE: Avoid rate limiting from Amazon
+        PURPOSE: Avoid rate limiting from Amazon by requeueing the throttled candidate,
+                 the concurrency controller has already backed off
         INPUT: bucket objcet
-        RETURN: Boolean
+        RETURN: Boolean - True if the candidate was requeued
         """
         lastBucket.status = -1
-        self.metadata['rate_limits'] += 1
-        self.metadata['failed_hit'] += 1
-        raise RateLimit("Rate limit hit, try -p/--proxy (must have aws creds)")
+        self.metadata.incr('rate_limits')
+        attempts = self.retries.get(lastBucket.name,0) + 1
+        if attempts <= self.RETRIES:
+            self.retries[lastBucket.name] = attempts
+            self.retry.append(lastBucket.name)
+            self.logger.log("HUNTER","WARN","{} throttled, requeued (concurrency {})".format(
+                lastBucket.name,self.controller.limit
+            ))
+            return True
+        # out of retries, count it as a failed try
+        self.retries.pop(lastBucket.name,None)
+        self.metadata.incr('total')
+        self.metadata.incr('failed_hit')
+        self.logger.log("HUNTER","ERRO","{} still throttled after {} retries, skipping".format(
+            lastBucket.name,self.RETRIES
+        ))
+        return False
+
+    def setConcurrency(self,concurrency):
+        """
+        PURPOSE: Validate the number of in-flight probes for the async engine
+        INPUT: Concurrency as given on the command line
+        RETURN: None
+        """
+        try:
+            self.concurrency = int(concurrency)
+            if self.concurrency <= 0:
+                raise ValueError
+        except ValueError:
+            self.logger.log("HUNTER","ERRO","Concurrency {} is not a positive integer".format(concurrency))
+            self.logger.log("HUNTER","WARN","Running with concurrency 500")
+            self.concurrency = 500
+
+    def setSubresources(self,selection):
+        """
+        PURPOSE: Choose which bucket subresources are collected for existing buckets
+        INPUT: Comma separated subresource names, "all" or "none"
+        RETURN: None
+        """
+        if selection == "all":
+            self.subresources = list(SUBRESOURCES)
+            return
+        if selection == "none":
+            self.subresources = []
+            return
+        chosen = [name.strip().lower() for name in selection.split(",") if name.strip()]
+        unknown = [name for name in chosen if name not in SUBRESOURCES]
+        if unknown:
+            self.logger.log("HUNTER","ERRO","Unknown metadata subresources {}, choose from {}".format(
+                ",".join(unknown),",".join(SUBRESOURCES)
+            ))
+            self.logger.log("HUNTER","WARN","Collecting all metadata")
+            self.subresources = list(SUBRESOURCES)
+            return
+        self.subresources = chosen
 
     def getBucketState(self,bucket):
         """
@@ -109,67 +304,120 @@ class Hunter:
         RETURN: True - open or exists, more work to be done; False - DNE. No more work.
         """
         try:
-            bucket.assignState()
-        except requests.exceptions.ConnectionError:
+            if bucket.headState():
+                bucket.assignState()
+        except (requests.exceptions.ConnectionError,requests.exceptions.Timeout):
+            # a ReadTimeout is no ConnectionError, the async engine skips both alike
             self.logger.log("HUNTER","WARN", "{} Connection Error".format(bucket.name))
-        self.metadata['total'] += 1
+        return self.tallyState(bucket)
+
+    def tallyState(self,bucket):
+        """
+        PURPOSE: Count the status assigned to a bucket in the hunt metadata
+        INPUT: Bucket object
+        RETURN: True - open or exists, more work to be done; False - DNE. No more work.
+        """
+        if bucket.status == -1:
+            return False # counted once it is retried or given up on
+        self.metadata.incr('total')
         if bucket.status == 0:
-            self.metadata['nonexist'] += 1
-            self.metadata['failed_hit'] += 1
+            self.metadata.incr('nonexist')
+            self.metadata.incr('failed_hit')
         elif bucket.status == 1:
-            self.metadata['denied'] += 1
+            self.metadata.incr('denied')
         elif bucket.status == 2:
-            self.metadata['disabled'] += 1
+            self.metadata.incr('disabled')
         elif bucket.status == 3:
             self.logger.log("HUNTER","INFO","{} is open, URL: {}".format(bucket.name,bucket.url))
-            self.metadata['open_list'] += 1
+            self.metadata.incr('open_list')
             return True # catch for status 3
         return False # catch for status -1,0,1,2
 
-    def parseBucket(self,cur_name):
+    def untally(self,status):
         """
-        PURPOSE: provide threadsafe request parsing functionality
-        INPUT: Self, Bucket Name
+        PURPOSE: Take back what tallyState counted for a bucket that is retried after all
+        INPUT: Self, status the bucket was counted with (1-3)
         RETURN: None
         """
-        bucket = Bucket(cur_name,self.BADCHARS)
+        self.metadata.incr('total',-1)
+        self.metadata.incr(['denied','disabled','open_list'][status - 1],-1)
+
+    def prepareBucket(self,cur_name):
+        """
+        PURPOSE: Build a bucket object with the proxy and user-agent settings applied
+        INPUT: Self, Bucket Name
+        RETURN: Bucket object
+        """
+        bucket = Bucket(
+            cur_name,self.BADCHARS,self.transport,self.endpoint,self.regional,self.regions,self.fallback
+        )
         if self.require_proxy:
             self.getCreds()
             self.fp.create_api(bucket.url)
             self.active.insert(0,self.fp.api_id)
+            # the proxy answers for the bucket's endpoint, it never moves
             bucket.url = self.fp.proxy
+            bucket.regional = None
+            bucket.regions = None
+            bucket.fallback = None
         if self.useragent:
             bucket.headers = {
                 "User-Agent":self.useragent
             }
-        # assign state of bucket and associated objects
-        if self.getBucketState(bucket):
-            testURL = bucket.enumContent()
-            readable = bucket.isReadable(testURL)
-            writeable = bucket.isWriteable(testURL)
-            # must handle all four states, as they are independent of each other
-            if readable and writeable:
-                bucket.status = 5
-                self.metadata['open_read'] += 1
-                self.metadata['open_write'] += 1
-                self.metadata['open_list'] -= 1
-                bucket.download = True
-                bucket.write = True
-            elif readable and not writeable:
-                bucket.status = 4
-                self.metadata['open_read'] += 1
-                self.metadata['open_list'] -= 1
-                bucket.download = True
-            elif writeable and not readable:
-                bucket.status = 5
-                self.metadata['open_write'] += 1
-                bucket.write = True
-            else:
-                return
+        return bucket
+
+    def parseBucket(self,cur_name):
+        """
+        PURPOSE: provide threadsafe request parsing functionality
+        INPUT: Self, Bucket Name
+        RETURN: None
+        """
+        bucket = None
+        try:
+            bucket = self.prepareBucket(cur_name)
+            # assign state of bucket and associated objects
+            self.controller.acquire()
+            try:
+                self.inspectBucket(bucket,self.getBucketState(bucket))
+            finally:
+                self.controller.release(bucket.status == -1)
+            self.storeResult(bucket)
+            if self.require_proxy:
+                self.active.remove(self.fp.api_id)
+                self.fp.delete_api(self.fp.api_id)
+        finally:
+            self.finish(cur_name,bucket)
+
+    def inspectBucket(self,bucket,isOpen):
+        """
+        PURPOSE: Test access and collect metadata for a bucket with an assigned state
+        INPUT: Self, Bucket object, whether the bucket is open
+        RETURN: None
+        DOCS:
+        |__ A check throttled after the probe leaves the bucket at status -1. Its probe was
+        |__ already counted, so that is taken back and the candidate is requeued like a
+        |__ throttled probe, rather than recorded with less access than it has.
+        |__ A check that fails to connect or times out keeps the bucket at its probe status,
+        |__ so one slow or unresolvable bucket can't end the hunt.
+        """
+        tallied = bucket.status # as counted by tallyState
+        try:
+            counts = self.checkAccess(bucket,isOpen)
+        except (requests.exceptions.ConnectionError,requests.exceptions.Timeout):
+            self.logger.log("HUNTER","WARN", "{} Connection Error during deep checks".format(bucket.name))
+            bucket.status = tallied
+            bucket.download = bucket.write = False
+            counts = []
+        if counts is None:
+            return
         # if the rate limit is hit, conduct avoidance
-        elif bucket.status == -1:
+        if bucket.status == -1:
+            if tallied > 0:
+                self.untally(tallied)
             self.doRateLimitAvoid(bucket)
-            return 
+            return
+        for counter, change in counts:
+            self.metadata.incr(counter,change)
         # store the bucket data in memory
         if bucket.status > 0: # if the bucket exists
             self.buckets[bucket.name] = bucket
@@ -179,17 +427,200 @@ class Hunter:
                 "INFO",
                 "Bucket {} is {}".format(bucket.name,replies[bucket.status])
             )
-            bucket.meta = bucket.metadata()
-        if self.require_proxy:
-            self.active.remove(self.fp.api_id)
-            self.fp.delete_api(self.fp.api_id)
-            
+
+    def checkAccess(self,bucket,isOpen):
+        """
+        PURPOSE: Run the deep checks (listing, readability, writeability, metadata)
+        INPUT: Self, Bucket object, whether the bucket is open
+        RETURN: List of (counter, change) to make, None if there is nothing to record
+        """
+        counts = [] # (counter, change), made once no check was throttled
+        if isOpen:
+            if self.listContents or self.deepList:
+                testURL = bucket.enumContent(
+                    self.listingSink(bucket),self.maxObjects,self.maxBytes,self.maxSeconds,
+                    self.listPool
+                )
+                if bucket.truncated:
+                    self.logger.log("HUNTER","WARN","Listing of {} stopped at {} objects (cap reached)".format(
+                        bucket.name,bucket.objects
+                    ))
+            else:
+                # the listability probe already returned the one key we need
+                testURL = bucket.testURL()
+                if bucket.firstObject:
+                    bucket.objects = 1
+                    bucket.content = bucket.formatObject(1,bucket.firstObject)
+            readable = writeable = False
+            if bucket.status != -1 and self.sample > 1:
+                readable = bucket.sampleReadable(self.sample,self.metaPool) > 0
+                self.logger.log("HUNTER","INFO","{} of {} sampled objects in {} are readable".format(
+                    bucket.sampled[0],bucket.sampled[1],bucket.name
+                ))
+            elif bucket.status != -1:
+                readable = bucket.isReadable(testURL)
+            if bucket.status != -1:
+                writeable = bucket.isWriteable(testURL)
+            # must handle all four states, as they are independent of each other
+            if bucket.status == -1:
+                pass
+            elif readable and writeable:
+                bucket.status = 5
+                counts = [('open_read',1),('open_write',1),('open_list',-1)]
+                bucket.download = True
+                bucket.write = True
+            elif readable and not writeable:
+                bucket.status = 4
+                counts = [('open_read',1),('open_list',-1)]
+                bucket.download = True
+            elif writeable and not readable:
+                bucket.status = 5
+                counts = [('open_write',1)]
+                bucket.write = True
+            else:
+                return None
+        if bucket.status > 0:
+            bucket.meta = bucket.metadata(self.subresources,self.metaPool)
+        return counts
+
+    async def probeBucket(self,session,bucket):
+        """
+        PURPOSE: Assign state to a bucket without blocking the event loop
+        INPUT: Self, aiohttp session, Bucket object
+        RETURN: None
+        """
+        metrics = self.transport.metrics
+        await self.transport.throttleAsync(PROBE)
+        kind, start = "head", time.monotonic()
+        try:
+            bucket.countRoute()
+            async with session.head(bucket.url,headers=bucket.headers) as r:
+                metrics.observe(kind,r.status,time.monotonic() - start)
+                if not bucket.headState(r.status,r.headers):
+                    return
+            # a redirect that moves the bucket (region, then addressing style) is repeated,
+            # only the final answer is classified, as in assignState, so a failed retry
+            # leaves the bucket as it was
+            for attempt in range(3):
+                await self.transport.throttleAsync(PROBE)
+                kind, start = "probe", time.monotonic()
+                bucket.countRoute()
+                async with session.get(bucket.url+PROBE_PARAMS,headers=bucket.headers) as r:
+                    body = await r.read()
+                    metrics.observe(kind,r.status,time.monotonic() - start,len(body))
+                    status, headers = r.status, r.headers
+                if attempt == 2 or errorCode(body) not in REDIRECTS or not bucket.reroute(headers,body):
+                    break
+            bucket.assignState(status,headers,body)
+        except (aiohttp.ClientError,asyncio.TimeoutError):
+            metrics.observe(kind,"error",time.monotonic() - start)
+            raise
+
+    async def parseBucketAsync(self,session,executor,cur_name):
+        """
+        PURPOSE: Async counterpart of parseBucket
+        INPUT: Self, aiohttp session, executor for deep inspection, Bucket Name
+        RETURN: None
+        """
+        bucket = None
+        try:
+            bucket = self.prepareBucket(cur_name)
+            await self.controller.acquireAsync()
+            # the slot is held through the deep checks too, as in parseBucket, so their
+            # throttling shrinks the limit as well
+            try:
+                try:
+                    await self.probeBucket(session,bucket)
+                except (aiohttp.ClientError,asyncio.TimeoutError):
+                    self.logger.log("HUNTER","WARN", "{} Connection Error".format(bucket.name))
+                isOpen = self.tallyState(bucket)
+                if bucket.status <= 0:
+                    # nothing left to request, only rate limit handling
+                    self.inspectBucket(bucket,isOpen)
+                else:
+                    # existing buckets are rare, so the blocking Bucket methods run on the pool
+                    await asyncio.get_running_loop().run_in_executor(
+                        executor,self.inspectBucket,bucket,isOpen
+                    )
+            finally:
+                self.controller.release(bucket.status == -1)
+            self.storeResult(bucket)
+        finally:
+            self.finish(cur_name,bucket)
+
+    def finish(self,cur_name,bucket):
+        """
+        PURPOSE: Count a finished candidate and tell the tracker, unless it was requeued
+        INPUT: Self, candidate name, Bucket object (None if it was never built)
+        RETURN: None
+        """
+        self.metadata.incr('finished')
+        requeued = bucket is not None and bucket.status == -1 and cur_name in self.retries
+        if bucket is not None and bucket.virtual and not requeued:
+            self.metadata.incr('virtual_fallback')
+        if self.tracker and not requeued:
+            self.tracker.done(cur_name)
+        if self.scheduler and not requeued:
+            # a candidate S3 never answered for teaches nothing
+            answered = bucket is not None and bucket.checked and bucket.status >= 0
+            self.scheduler.done(cur_name,bucket.status > 0 if answered else None)
+
+    def storeResult(self,bucket):
+        """
+        PURPOSE: Persist a bucket's final state so later runs can skip it, and hand
+                 findings to the result sinks as soon as they are classified
+        INPUT: Self, Bucket object
+        RETURN: None
+        """
+        if self.store and bucket.checked and bucket.status >= 0:
+            self.store.record(bucket)
+        if self.sinks and bucket.checked and bucket.status > 0:
+            record = bucketRecord(bucket)
+            for sink in self.sinks:
+                sink.write(record)
+
+    def restoreResult(self,row):
+        """
+        PURPOSE: Bring a stored finding back into this run's report
+        INPUT: Self, row returned by ResultStore.lookup
+        RETURN: None
+        """
+        if row['status'] <= 0:
+            return
+        bucket = Bucket(row['name'],self.BADCHARS,self.transport)
+        bucket.status = row['status']
+        bucket.url = row['url']
+        bucket.download = bool(row['download'])
+        bucket.write = bool(row['write'])
+        bucket.meta = row['meta']
+        bucket.content = row['content']
+        self.buckets[bucket.name] = bucket
+
+    def listingSink(self,bucket):
+        """
+        PURPOSE: Log a bucket's objects as they are listed, keeping only a short preview
+                 on the bucket for the report
+        INPUT: Self, Bucket object
+        RETURN: sink callable for Bucket.enumContent
+        """
+        preview = []
+        bucket.content = ""
+        def sink(counter,record):
+            line = bucket.formatObject(counter,record)
+            self.logger.log("LISTING","INFO","{}{}".format(bucket.name,line.rstrip("\n")))
+            if counter <= self.PREVIEW:
+                preview.append(line)
+                bucket.content = "".join(preview)
+        return sink
+
     def recordBucket(self,bucket):
         if bucket.status <= 2:
             return # bucket DNE or disabled / denied
         replies = ["non-existent","denied","disabled","open","readable","writeable"]
         self.logger.log("HUNTER","INFO","######## Record for {} ########".format(bucket.name))
         self.logger.log("HUNTER","INFO","{} is {}".format(bucket.name,replies[bucket.status]))
+        if bucket.sampled:
+            self.logger.log("HUNTER","INFO","{} of {} sampled objects are readable".format(*bucket.sampled))
         if bucket.meta:
             self.logger.log(
                 "HUNTER",
@@ -200,23 +631,100 @@ class Hunter:
         # list the content, get a valid URL to test
         self.logger.log("HUNTER","INFO","Listing {}".format(bucket.url))
         self.logger.log("HUNTER","INFO","\n{}".format(bucket.content))
+        if bucket.objects > self.PREVIEW:
+            self.logger.log("HUNTER","INFO","... {} objects listed{}, see LISTING lines for the rest".format(
+                bucket.objects," (truncated)" if bucket.truncated else ""
+            ))
 
         self.logger.log("HUNTER","INFO","######## End of Record ########")
 
-    def nameGenerator(self,keyword):
+    def nameGenerator(self,keyword,tagged=False,modifiers=None):
         """
         PURPOSE: modify the keyword and generate new name candidates
-        INPUT: keyword
-        RETURN: list of candidates from keyword seed
+        INPUT: keyword, (optional) True to pair each candidate with its pattern, modifiers
+               to use instead of the whole wordlist
+        RETURN: generator of candidates from keyword seed, or of (candidate, (modifier,
+                combinator, position)) pairs if tagged
         """
-        formatted_names = []
-        for name in self.modifiers:
+        for name in self.modifiers if modifiers is None else modifiers:
             if name != "":
                 for char in self.COMBINATORS:
                     # format as prefix and suffix with modifier
-                    formatted_names.insert(0,"{}{}{}".format(keyword, char, name))
-                    formatted_names.insert(0,"{}{}{}".format(name, char, keyword))
-        return formatted_names
+                    if tagged:
+                        yield "{}{}{}".format(name, char, keyword), (name,char,PREFIX)
+                        yield "{}{}{}".format(keyword, char, name), (name,char,SUFFIX)
+                    else:
+                        yield "{}{}{}".format(name, char, keyword)
+                        yield "{}{}{}".format(keyword, char, name)
+
+    def estimate(self):
+        """
+        PURPOSE: Upper bound on the candidates this hunt will generate, for the ETA
+        INPUT: Self
+        RETURN: Number of candidates before duplicates and invalid names are dropped
+        """
+        modifiers = sum(1 for name in self.modifiers if name != "")
+        estimate = len(self.keywords) * modifiers * len(self.COMBINATORS) * 2
+        return estimate // self.shard[1] if self.shard else estimate
+
+    def queueDepth(self):
+        """
+        PURPOSE: Candidates handed to workers but not finished, plus throttled requeues
+        INPUT: Self
+        RETURN: Number of queued candidates
+        """
+        return self.metadata['queued'] - self.metadata['finished'] + len(self.retry)
+
+    def candidates(self):
+        """
+        PURPOSE: stream the candidates for every keyword without building them up front,
+                 dropping duplicates and invalid names before they are queued
+        INPUT: Self
+        RETURN: generator of normalized candidate names
+        DOCS:
+        |__ With a scheduler the candidates come out best pattern first, otherwise in
+        |__ wordlist order. Either way none are handed out once maxRequests are sent.
+        """
+        if self.source is not None:
+            # already filtered where they came from
+            names = self.source
+        elif self.scheduler:
+            names = self.scheduler.schedule(self.generate(tagged=True))
+        else:
+            names = self.generate()
+        for name in names:
+            if self.maxRequests and self.transport.sent[PROBE] + self.transport.sent[DEEP] >= self.maxRequests:
+                self.logger.log("HUNTER","STAT","Request budget of {} spent, no new candidates are queued".format(
+                    self.maxRequests
+                ))
+                return
+            yield name
+
+    def generate(self,tagged=False):
+        """
+        PURPOSE: Candidates for every keyword that are neither filtered out nor cached
+        INPUT: Self, (optional) True to pair each candidate with its pattern, for the scheduler
+        RETURN: generator of normalized names, or of (name, pattern) pairs if tagged
+        """
+        self.filter = CandidateFilter(self.BADCHARS,self.shard)
+        if tagged:
+            # best modifiers first, each one for every keyword, so a hit for one keyword
+            # moves the modifier's candidates for the others up while they still wait
+            names = (
+                item for m in self.scheduler.rank(self.modifiers)
+                for k in self.keywords for item in self.nameGenerator(k,True,[m])
+            )
+        else:
+            names = (name for k in self.keywords for name in self.nameGenerator(k))
+        for item in self.filter.filter(names,tagged):
+            name = item[0] if tagged else item
+            row = self.store.lookup(name) if self.store else None
+            if row is None:
+                yield item
+                continue
+            self.restoreResult(row)
+            if tagged:
+                self.scheduler.record(item[1],row['status'] > 0)
 
     def hunt(self):
         """
@@ -227,25 +735,184 @@ class Hunter:
         if self.require_proxy and self.threads != 1:
             self.threads = 1
             self.logger.log("FIREPROX","WARN","FireProx can only be run single threaded")
+        if self.engine == "async" and self.require_proxy:
+            self.engine = "thread"
+            self.logger.log("FIREPROX","WARN","FireProx can only be run with the thread engine")
+        elif self.engine == "async" and aiohttp is None:
+            self.engine = "thread"
+            self.logger.log("HUNTER","WARN","aiohttp is not installed, falling back to the thread engine")
+
+        ceiling = self.concurrency if self.engine == "async" else self.threads
+        self.controller = ConcurrencyController(ceiling,self.backoff)
+        # long-lived pool for the metadata fan-out, so its threads keep their connections
+        fanout = max(1,len(self.subresources) - 1) * self.threads
+        # deep listing partitions share one pool across every open bucket
+        self.listPool = ThreadPoolExecutor(max_workers=self.listWorkers) if self.deepList else None
+        display = Progress(self,self.progress) if self.progress else None
+        if display:
+            display.start()
+        if self.metricsPath and self.metricsInterval:
+            self.transport.metrics.start(self.metricsPath,self.metricsInterval,self.counters)
+        try:
+            with ThreadPoolExecutor(max_workers=min(fanout,64)) as self.metaPool:
+                if self.engine == "async":
+                    asyncio.run(self.huntAsync())
+                else:
+                    self.huntThreaded()
+        finally:
+            if display:
+                display.stop()
+            self.transport.metrics.stop()
+            if self.listPool:
+                self.listPool.shutdown(wait=False,cancel_futures=True)
+            self.metaPool = None
+            self.listPool = None
+
+        self.report()
+        return self.metadata['total']
+
+    def huntThreaded(self):
+        """
+        PURPOSE: run one blocking worker per candidate on a thread pool
+        INPUT: Self
+        RETURN: None
+        """
+        backlog = self.threads * self.BACKLOG
         with ThreadPoolExecutor(max_workers=self.threads) as executor:
-            for k in self.keywords:
-                # permutate the names based on the modifiers wordlist...
-                fnames = self.nameGenerator(k)
-                # ... then kick off a thread for each name.
-                for fname in fnames:
-                    self.processes.append(executor.submit(self.parseBucket,fname))
-            # everything is submitted to futures immediately, so interrupt handling
-            # is done here
+            # only a bounded number of candidates are queued at a time, and
+            # finished futures are dropped as soon as they are reaped
             try:
-                for future in as_completed(self.processes):
-                    future.result()
+                for fname in self.candidates():
+                    # throttled candidates go back out ahead of new ones
+                    while self.retry:
+                        self.queue(executor,self.retry.popleft(),backlog)
+                    self.queue(executor,fname,backlog)
+                while self.processes or self.retry:
+                    if self.retry:
+                        self.queue(executor,self.retry.popleft(),backlog)
+                    else:
+                        self.reap()
             except:
+                for future in self.processes:
+                    future.cancel()
                 executor._threads.clear()
                 thread._threads_queues.clear()
                 raise
 
-        self.report()
-        return self.metadata['total']
+    def queue(self,executor,fname,backlog):
+        """
+        PURPOSE: submit a candidate once there is room in the bounded work queue
+        INPUT: Self, executor, candidate name, maximum queued futures
+        RETURN: None
+        """
+        if len(self.processes) >= backlog:
+            self.reap()
+        self.metadata.incr('queued')
+        self.processes.add(executor.submit(self.parseBucket,fname))
+
+    def reap(self):
+        """
+        PURPOSE: wait for at least one queued candidate to finish and release it
+        INPUT: Self
+        RETURN: None
+        """
+        done, self.processes = wait(self.processes,return_when=FIRST_COMPLETED)
+        for future in done:
+            future.result()
+        self.tick()
+
+    def tick(self):
+        """
+        PURPOSE: periodically log achieved vs. allowed request rate while hunting
+        INPUT: Self
+        RETURN: None
+        """
+        now = time.monotonic()
+        if now - self.lastRate >= self.RATE_INTERVAL:
+            self.lastRate = now
+            self.logger.log("HUNTER","STAT","Request rate: {}".format(self.transport.rateReport()))
+
+    async def huntAsync(self):
+        """
+        PURPOSE: keep up to self.concurrency probes in flight on a single event loop
+        INPUT: Self
+        RETURN: None
+        """
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            async with self.transport.asyncSession(self.concurrency) as session:
+                try:
+                    for fname in self.candidates():
+                        while self.retry:
+                            pending = await self.queueAsync(
+                                pending,session,executor,self.retry.popleft()
+                            )
+                        pending = await self.queueAsync(pending,session,executor,fname)
+                    while pending or self.retry:
+                        if self.retry:
+                            pending = await self.queueAsync(
+                                pending,session,executor,self.retry.popleft()
+                            )
+                            continue
+                        done, pending = await asyncio.wait(
+                            pending,return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for task in done:
+                            task.result()
+                        self.tick()
+                except BaseException:
+                    for task in pending:
+                        task.cancel()
+                    raise
+
+    async def queueAsync(self,pending,session,executor,fname):
+        """
+        PURPOSE: start a probe task once fewer than self.concurrency are pending
+        INPUT: Self, pending tasks, aiohttp session, executor, candidate name
+        RETURN: Updated set of pending tasks
+        """
+        if len(pending) >= self.concurrency:
+            done, pending = await asyncio.wait(
+                pending,return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+            self.tick()
+        self.metadata.incr('queued')
+        pending.add(asyncio.ensure_future(
+            self.parseBucketAsync(session,executor,fname)
+        ))
+        return pending
+
+    def counters(self):
+        """
+        PURPOSE: Every hunt counter in one flat dict, for the report, the metrics exports
+                 and merging shards
+        INPUT: Self
+        RETURN: dict of counter name to value
+        """
+        counts = self.metadata.snapshot()
+        stats = self.transport.stats.snapshot()
+        counts['requests'] = stats['requests']
+        counts['connections_opened'] = stats['new']
+        counts['connections_reused'] = stats['reused']
+        counts['candidates'] = self.filter.stats['candidates']
+        counts['duplicate'] = self.filter.stats['duplicate']
+        counts['invalid'] = self.filter.stats['invalid']
+        counts['other_shard'] = self.filter.stats['other_shard']
+        counts['cached'] = self.store.stats['skipped'] if self.store else 0
+        counts['throttled'] = self.controller.stats['throttled']
+        regions = self.regions.stats.snapshot()
+        counts['regions_learned'] = regions['learned']
+        counts['regions_cached'] = regions['cached']
+        counts['redirects_saved'] = regions['saved']
+        streams = self.transport.streams.snapshot()
+        counts['h2_requests'] = streams['requests']
+        counts['h2_streams'] = streams['streams']
+        counts['h2_stalls'] = streams['stalls']
+        counts['h2_stall_ms'] = streams['stall_ms']
+        counts['h1_fallback'] = streams['fallback']
+        return counts
 
     def report(self):
         """
@@ -254,52 +921,25 @@ class Hunter:
         RETURN: None
         """
         self.logger.log("HUNTER","STAT","Parsing complete, compiling data...")
-        for name in self.buckets.keys():
+        for name in list(self.buckets.keys()):
+            if name in self.reported:
+                continue # already recorded by an earlier report
+            self.reported.add(name)
             # writing to a file/stdout was not threadsafe
             self.recordBucket(self.buckets[name])
 
     def status(self):
         # log hunt meta results
-        total = self.metadata['total']
-        try:
-            valid = "{:.2f}".format(100*(
-                (self.metadata['total'] - self.metadata['failed_hit']) / \
-                total
-                )
-            )
-        except ZeroDivisionError:
-            valid = "{:.2f}".format(0)
-        try:
-            accessible = "{:.2f}".format(100*(
-                (self.metadata['open_list']+self.metadata['open_read']+self.metadata['open_write']) / \
-                (self.metadata['total'] - self.metadata['failed_hit'])
-                )
-            )
-        except ZeroDivisionError:
-            accessible = "{:.2f}".format(0)
-        denied = self.metadata['denied']
-        disabled = self.metadata['disabled']
-        listable = self.metadata['open_list']
-        downloadable = self.metadata['open_read']
-        writeable = self.metadata['open_write']
-        ratelimits = self.metadata['rate_limits']
-        self.logger.log("HUNTER","STAT","Hunt complete.")
-        self.logger.log("HUNTER","INFO",f"\nResults:\n" + \
-            f"\tTotal tries: {total}\n" + \
-            f"\tPercent valid: {valid}%\n" + \
-            f"\tPercent of valid & accessible: {accessible}%\n" + \
-            f"\tDenied: {denied}\n" + \
-            f"\tDisabled: {disabled}\n" + \
-            f"\tListable: {listable}\n" + \
-            f"\tDownloadable: {downloadable}\n" + \
-            f"\tWriteable: {writeable}\n" + \
-            f"\tRate limits hit: {ratelimits}\n"
+        logResults(
+            self.logger,
+            self.counters(),
+            self.transport.metrics.summary()['stages'],
+            [name for name in self.buckets.keys() if self.buckets[name].download],
+            [name for name in self.buckets.keys() if self.buckets[name].write],
+            "{}/{}".format(self.controller.limit,self.controller.stats['lowest']),
+            self.transport.rateReport()
         )
-        self.logger.log("HUNTER","INFO","Downloadable buckets:{}\n".format("".join(
-            {("\n\t"+name if self.buckets[name].download else "") for name in self.buckets.keys()}
-        )))
-        self.logger.log("HUNTER","INFO","Writeable buckets:{}\n".format("".join(
-            {("\n\t"+name if self.buckets[name].write else "") for name in self.buckets.keys()}
-        )))
+        if self.scheduler:
+            self.logger.log("HUNTER","STAT","Prioritization: {}".format(self.scheduler.report()))
         self.logger.log("HUNTER","INFO","Log stored to {}".format(self.logger.logpath))
         return 0
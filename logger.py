@@ -1,8 +1,14 @@
+import atexit
 import os
-import requests
+import sys
+import queue
+import threading
 import time
 from pathlib import Path
-from datetime import datetime as dtg
+
+# GLOBALS
+BATCH = 256         # lines buffered before a flush
+FLUSH_INTERVAL = 0.5 # seconds a buffered line may wait before a flush
 
 class Logger:
     # PURPOSE: Provide an easy-to-use format for logging capabilities
@@ -16,7 +22,7 @@ class Logger:
     # |_____ DEBUG: messages to assist with debugging
     # |
     # |__[ATTR] VERBOSITY: {
-    # |         0:no logging, 
+    # |         0:no logging,
     # |         1:log to file only,
     # |         2:log STAT, WARN, and ERRO to stdout... log all to file,
     # |         3:log all to stdout and file,
@@ -25,13 +31,25 @@ class Logger:
     # |
     # |__[ATTR] LOGFILE: logged to ./logs/<epoch_time>.log as plaintext, newline separated
     # |
+    # |__[ATTR] QUEUE: log() only decides where a line goes and queues it, so any thread
+    # |         can log without locking. A single writer thread formats the lines, keeps
+    # |         the logfile open and flushes every BATCH lines or FLUSH_INTERVAL seconds.
+    # |         cleanup() also runs at exit, so lines queued before an uncaught exception or
+    # |         sys.exit are still written.
+    # |
     # |__[FUNC] logToFile
-    # |__[FUNC] logToSTDOUT 
+    # |__[FUNC] logToSTDOUT
 
     def __init__(self,verbosity=2,logpath=None):
         self.loglevels = ["INFO","STAT","WARN","ERRO","DEBUG"]
         self.verbosity = verbosity % 4
         self.logpath = logpath
+        self.logfile = None
+        self.stamp = (None,"")
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.run,daemon=True)
+        self.writer.start()
+        atexit.register(self.cleanup)
 
 
     def initLogFile(self,newLogPath=None):
@@ -54,37 +72,51 @@ class Logger:
             self.logToSTDOUT("LOGGER","WARN","Failed to initialize logdir, continuing with ONLY stdout.{}".format(e))
             pass
         try:
-            self.logfile = open(self.logpath,'w')
-            self.logfile.write("Palebail log for run at {}\n".format(int(time.time())))
-            self.logfile.close()
+            logfile = open(self.logpath,'w')
+            logfile.write("Palebail log for run at {}\n".format(int(time.time())))
+            logfile.close()
         except:
             self.logToSTDOUT("LOGGER","WARN","Failed to initialize logfile, continuing with ONLY stdout.")
             pass
 
 
-    def logToFile(self,source,level,message):
-        # PURPOSE: Log message to logfile
-        # INPUT: Source of message, level of message, message itself
-        # RETURN: True - it successfully logged to file. False - did not log to file.
+    def timestamp(self,when):
+        # PURPOSE: Format a timestamp, reusing the last one within the same second
+        # INPUT: Epoch time
+        # RETURN: Formatted timestamp string
+
+        second = int(when)
+        if self.stamp[0] != second:
+            self.stamp = (second,time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(second)))
+        return self.stamp[1]
+
+
+    def formatLine(self,source,level,message,when=None):
+        return "[{}] {} -- {} -- {}\n".format(
+            source,self.timestamp(time.time() if when is None else when),level,message
+        )
 
-        try:
-            self.logfile = open(self.logpath,'a')
-        except:
-            self.logToSTDOUT("LOGGER","WARN","Failed to open logfile, continuing with ONLY stdout.")
-            self.verbosity = 4
-            return False
+
+    def logToFile(self,lines):
+        # PURPOSE: Write formatted lines to the persistent logfile handle (writer thread only)
+        # INPUT: List of formatted lines
+        # RETURN: True - it successfully logged to file. False - did not log to file.
 
         try:
-            self.logfile.write("[{}] {} -- {} -- {}\n".format(source,dtg.now().strftime("%Y-%m-%d %H:%M:%S"),level,message))
+            if self.logfile is None:
+                self.logfile = open(self.logpath,'a',buffering=1024*1024)
+            self.logfile.write("".join(lines))
             return True
         except FileNotFoundError:
             self.logToSTDOUT("LOGGER","WARN","Log file no longer exists... logging will continue ONLY in stdout.")
-            pass
         except:
             self.logToSTDOUT("LOGGER","WARN","Logger experienced crit fail, proceeding on stdout")
+
+        try:
+            self.logfile.close()
+        except:
             pass
-                 
-        self.logfile.close()
+        self.logfile = None
         self.verbosity = 4
         return False
 
@@ -94,7 +126,54 @@ class Logger:
         # INPUT: source and level of message, as well as the message itself
         # RETURN: None
 
-        print("[{}] {} -- {} -- {}".format(source,dtg.now().strftime("%Y-%m-%d %H:%M:%S"),level,message))
+        sys.stdout.write(self.formatLine(source,level,message))
+        sys.stdout.flush()
+
+
+    def run(self):
+        # PURPOSE: Writer thread, batch queued lines to the logfile and stdout
+        # INPUT: Self
+        # RETURN: None
+
+        fileLines = []
+        outLines = []
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while True:
+            try:
+                entry = self.queue.get(timeout=max(0,deadline - time.monotonic()))
+            except queue.Empty:
+                entry = False
+            if entry:
+                when, source, level, message, toFile, toStdout = entry
+                line = self.formatLine(source,level,message,when)
+                if toFile:
+                    fileLines.append(line)
+                if toStdout:
+                    outLines.append(line)
+            if entry is None or len(fileLines) + len(outLines) >= BATCH \
+                    or time.monotonic() >= deadline:
+                self.flush(fileLines,outLines)
+                fileLines = []
+                outLines = []
+                deadline = time.monotonic() + FLUSH_INTERVAL
+            if entry is None:
+                break
+
+
+    def flush(self,fileLines,outLines):
+        # PURPOSE: Write one batch, falling back to stdout once the logfile is gone
+        # INPUT: Formatted lines for the logfile and for stdout
+        # RETURN: None
+
+        if fileLines:
+            if self.verbosity == 4 or not self.logToFile(fileLines):
+                # log to file fails, verbosity now at 4
+                outLines = fileLines
+            else:
+                self.logfile.flush()
+        if outLines:
+            sys.stdout.write("".join(outLines))
+            sys.stdout.flush()
 
 
     def log(self,source,level,message):
@@ -107,46 +186,44 @@ class Logger:
 
         # Verb 0
         if self.verbosity == 0:
-            pass
+            return
 
         # Verb 1
         elif self.verbosity == 1:
-            if not self.logToFile(source,level,message):
-                # log to file fails, verbosity now at 4
-                self.log(source,level,message)
+            toFile, toStdout = True, False
+
         # Verb 2
         elif self.verbosity == 2:
-            if not self.logToFile(source,level,message):
-                # log to file fails, verbosity now at 4
-                self.log(source,level,message)
-            elif level in ["STAT","WARN","ERRO"]:
-                self.logToSTDOUT(source,level,message)
-        
+            toFile, toStdout = True, level in ["STAT","WARN","ERRO"]
+
         # Verb 3
         elif self.verbosity == 3:
-            if not self.logToFile(source,level,message):
-                # log to file fails, verbosity now at 4
-                self.log(source,level,message)
-            self.logToSTDOUT(source,level,message)
+            toFile, toStdout = True, True
 
         # Verb 4
         elif self.verbosity == 4:
-            self.logToSTDOUT(source,level,message)
-        
+            toFile, toStdout = False, True
+
         # Verb Unknown
         else:
             self.logToSTDOUT("LOGGER","WARN","Invalid verbosity level, defaulting to 2")
             self.verbosity = 2
-            self.log(source,level,message)
+            return self.log(source,level,message)
+
+        self.queue.put((time.time(),source,level,message,toFile,toStdout))
 
 
     def cleanup(self):
-        # PURPOSE: perform cleanup for logger
+        # PURPOSE: perform cleanup for logger, draining every queued line first
         # INPUT: Self
         # RETURN: None
 
-        if self.verbosity in [1,2,3]: #log levels which include writing to file
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if self.logfile:
             try:
                 self.logfile.close()
             except:
-                self.logToSTDOUT("LOGGER","WARN","Unable to close logfile")
\ No newline at end of file
+                self.logToSTDOUT("LOGGER","WARN","Unable to close logfile")
+            self.logfile = None
@@ -0,0 +1,239 @@
+#/usr/bin/env python3
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# GLOBALS
+# latency bucket upper bounds in seconds, 1ms to ~65s in steps of 2^(1/4) (about 19%)
+BOUNDS = [0.001 * 2 ** (i / 4) for i in range(65)]
+QUANTILES = (0.5,0.9,0.99)
+PREFIX = "palebail"
+
+# HELPERS
+def quantile(counts,total,q):
+    """
+    PURPOSE: Estimate a quantile from histogram bucket counts
+    INPUT: Per-bucket counts (last one is overflow), total observations, quantile 0-1
+    RETURN: Upper bound of the bucket holding the quantile, in seconds
+    """
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return BOUNDS[i] if i < len(BOUNDS) else float("inf")
+    return float("inf")
+
+def writeAtomic(path,text):
+    # readers polling the export never see a half written file
+    tmp = "{}.tmp".format(path)
+    with open(tmp,"w") as f:
+        f.write(text)
+    os.replace(tmp,path)
+
+class Metrics:
+    """
+    PURPOSE: Latency histograms and byte counters for every request, by kind and HTTP status
+    INPUT: None
+    DOCS:
+    |__[ATTR] KINDS
+    |_____ head: existence HEAD, probe: max-keys=1 listability GET, list: listing pages,
+    |_____ read: ranged object GET, write: test PUT, meta: subresource GETs
+    |__[ATTR] SHARDS
+    |_____ Like ShardedCounter, each thread records into its own dict of
+    |_____ (kind,status) -> [bucket counts, count, seconds, max, bytes], merged on read
+    |__[FUNC] observe - record one response (status "error" if no response came back)
+    |__[FUNC] addBytes - count body bytes of a streamed response as they are read
+    |__[FUNC] summary - p50/p90/p99/max, count and bytes per kind, per kind+status and
+    |_____              for every request together ("overall"), plus any hunt counters
+    |__[FUNC] prometheus - Prometheus text exposition format
+    |__[FUNC] absorb - add the histograms of an exported summary, to merge shards
+    |__[FUNC] export - write <prefix>.json and <prefix>.prom
+    |__[FUNC] start / stop - export every interval seconds while hunting
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        self.started = time.time()
+        self.done = threading.Event()
+        self.thread = None
+
+    def shard(self):
+        shard = getattr(self.local,"shard",None)
+        if shard is None:
+            shard = {}
+            with self.lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+        return shard
+
+    def observe(self,kind,status,seconds,received=0):
+        shard = self.shard()
+        key = (kind,str(status))
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [[0] * (len(BOUNDS) + 1),0,0.0,0.0,0]
+        series[0][bisect_left(BOUNDS,seconds)] += 1
+        series[1] += 1
+        series[2] += seconds
+        if seconds > series[3]:
+            series[3] = seconds
+        series[4] += received
+
+    def addBytes(self,kind,status,received):
+        shard = self.shard()
+        key = (kind,str(status))
+        series = shard.get(key)
+        if series is None:
+            # the response may have been observed by another thread's shard
+            series = shard[key] = [[0] * (len(BOUNDS) + 1),0,0.0,0.0,0]
+        series[4] += received
+
+    def merged(self):
+        """
+        PURPOSE: Add up every thread's shard
+        INPUT: Self
+        RETURN: dict of (kind,status) -> [bucket counts, count, seconds, max, bytes]
+        """
+        with self.lock:
+            shards = list(self.shards)
+        totals = {}
+        for shard in shards:
+            for key, series in list(shard.items()):
+                total = totals.setdefault(key,[[0] * (len(BOUNDS) + 1),0,0.0,0.0,0])
+                total[0] = [a + b for a, b in zip(total[0],series[0])]
+                total[1] += series[1]
+                total[2] += series[2]
+                total[3] = max(total[3],series[3])
+                total[4] += series[4]
+        return totals
+
+    def describe(self,series):
+        counts, count, seconds, slowest, received = series
+        stats = {
+            "count":count,
+            "bytes":received,
+            "seconds":seconds,
+            "mean":seconds / count if count else 0.0,
+            "max":slowest,
+            "buckets":counts
+        }
+        for q in QUANTILES:
+            stats["p{}".format(int(q * 100))] = min(quantile(counts,count,q),slowest)
+        return stats
+
+    def summary(self,counters=None):
+        """
+        PURPOSE: Machine readable snapshot of every histogram
+        INPUT: Self, (optional) dict of hunt counters to include
+        RETURN: dict with per kind totals ("stages"), every request together ("overall"),
+                per kind+status series ("requests") and the counters
+        """
+        totals = self.merged()
+        stages = {}
+        overall = [[0] * (len(BOUNDS) + 1),0,0.0,0.0,0]
+        for (kind, status), series in totals.items():
+            for total in (stages.setdefault(kind,[[0] * (len(BOUNDS) + 1),0,0.0,0.0,0]),overall):
+                total[0] = [a + b for a, b in zip(total[0],series[0])]
+                total[1] += series[1]
+                total[2] += series[2]
+                total[3] = max(total[3],series[3])
+                total[4] += series[4]
+        return {
+            "started":self.started,
+            "exported":time.time(),
+            "overall":self.describe(overall),
+            "stages":{kind:self.describe(series) for kind, series in sorted(stages.items())},
+            "requests":[
+                dict(kind=kind,status=status,**self.describe(series))
+                for (kind, status), series in sorted(totals.items())
+            ],
+            "counters":counters or {}
+        }
+
+    def absorb(self,summary):
+        """
+        PURPOSE: Add every series of an exported summary into this thread's shard
+        INPUT: dict as returned by summary (or read back from a .json export)
+        RETURN: None
+        """
+        shard = self.shard()
+        self.started = min(self.started,summary['started'])
+        for entry in summary['requests']:
+            key = (entry['kind'],entry['status'])
+            series = shard.setdefault(key,[[0] * (len(BOUNDS) + 1),0,0.0,0.0,0])
+            series[0] = [a + b for a, b in zip(series[0],entry['buckets'])]
+            series[1] += entry['count']
+            series[2] += entry['seconds']
+            series[3] = max(series[3],entry['max'])
+            series[4] += entry['bytes']
+
+    def prometheus(self,counters=None):
+        """
+        PURPOSE: Render the histograms in the Prometheus text exposition format
+        INPUT: Self, (optional) dict of hunt counters to include
+        RETURN: String
+        """
+        name = PREFIX + "_request_duration_seconds"
+        lines = [
+            "# HELP {} Time from sending a request to its response headers.".format(name),
+            "# TYPE {} histogram".format(name)
+        ]
+        totals = sorted(self.merged().items())
+        for (kind, status), (counts, count, seconds, slowest, received) in totals:
+            labels = 'kind="{}",status="{}"'.format(kind,status)
+            cumulative = 0
+            for bound, bucketCount in zip(BOUNDS,counts):
+                cumulative += bucketCount
+                lines.append('{}_bucket{{{},le="{:.6g}"}} {}'.format(name,labels,bound,cumulative))
+            lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name,labels,count))
+            lines.append("{}_sum{{{}}} {:.6f}".format(name,labels,seconds))
+            lines.append("{}_count{{{}}} {}".format(name,labels,count))
+        lines.append("# HELP {}_response_bytes_total Response body bytes received.".format(PREFIX))
+        lines.append("# TYPE {}_response_bytes_total counter".format(PREFIX))
+        for (kind, status), series in totals:
+            lines.append('{}_response_bytes_total{{kind="{}",status="{}"}} {}'.format(
+                PREFIX,kind,status,series[4]
+            ))
+        if counters:
+            lines.append("# HELP {}_hunt Hunt counters (candidates, statuses, connections).".format(PREFIX))
+            lines.append("# TYPE {}_hunt gauge".format(PREFIX))
+            for key, value in sorted(counters.items()):
+                lines.append('{}_hunt{{counter="{}"}} {}'.format(PREFIX,key,value))
+        return "\n".join(lines) + "\n"
+
+    def export(self,prefix,counters=None):
+        """
+        PURPOSE: Write the metrics as <prefix>.json and <prefix>.prom
+        INPUT: Output path prefix, (optional) dict of hunt counters to include
+        RETURN: None
+        """
+        writeAtomic("{}.json".format(prefix),json.dumps(self.summary(counters),indent=2))
+        writeAtomic("{}.prom".format(prefix),self.prometheus(counters))
+
+    def start(self,prefix,interval,counters=None):
+        """
+        PURPOSE: Export every interval seconds from a background thread until stop
+        INPUT: Output path prefix, seconds between exports, (optional) callable
+               returning the hunt counters
+        RETURN: None
+        """
+        self.done.clear()
+        self.thread = threading.Thread(target=self.run,args=(prefix,interval,counters),daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.done.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self,prefix,interval,counters):
+        while not self.done.wait(interval):
+            self.export(prefix,counters() if counters else None)
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+#####################################
+########### mockserver.py ###########
+#####################################
+# PURPOSE:
+#   Local stand-in for S3 so palebail can be run and benchmarked offline, e.g.
+#
+#   python3 mockserver.py --port 9000 --config buckets.json --latency 0.01
+#   palebail.py -k acme --endpoint http://127.0.0.1:9000/{bucket}/
+#
+# Buckets not named in the config answer NoSuchBucket. Requests for /<region>/<bucket>/
+# stand in for that region's endpoint, e.g. with
+#
+#   palebail.py -k acme --endpoint http://127.0.0.1:9000/{bucket}/ \
+#       --regional-endpoint http://127.0.0.1:9000/{region}/{bucket}/
+#
+# With h2 installed, connections that open with the HTTP/2 preface (h2c, prior
+# knowledge, as palebail.py --http2 sends to http:// endpoints) are served as HTTP/2.
+
+# IMPORTS
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from http.client import HTTPMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.sax.saxutils import escape
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+    from h2.settings import SettingCodes
+except ImportError:
+    h2 = None
+
+# GLOBALS
+REGION = "us-east-1"
+OBJECTS = 5 # objects in an open bucket unless the config says otherwise
+MAX_KEYS = 1000
+FOLDERS = ["logs","data","img","docs"]
+CONTENT = b"palebail mock object\n"
+SUBRESOURCES = [
+    "acl","accelerate","cors","encryption","location",
+    "logging","policy","replication","website"
+]
+STATES = ["denied","disabled","open","readable","writeable"]
+XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+MAX_STREAMS = 100 # concurrent streams an HTTP/2 client may open per connection
+# a leading path segment naming a region, e.g. eu-west-1 or us-gov-west-1
+REGION_SEGMENT = re.compile(r"^[a-z]{2}(-gov)?-[a-z]+-\d+$")
+
+# HELPERS
+def errorBody(code,message,**extra):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{}</Code><Message>{}</Message>{}'
+        '<RequestId>MOCK</RequestId><HostId>MOCK</HostId></Error>'.format(
+            code,message,"".join("<{0}>{1}</{0}>".format(k,escape(v)) for k, v in extra.items())
+        )
+    ).encode()
+
+def loadBuckets(path):
+    """
+    PURPOSE: Read the bucket config
+    INPUT: Path to a JSON file of {"buckets": {name: state or {"state","objects","region","addressing"}}}
+    RETURN: dict of bucket name to spec dict
+    """
+    with open(path,"r") as f:
+        config = json.load(f)
+    return normalizeBuckets(config.get("buckets",config))
+
+def normalizeBuckets(buckets):
+    specs = {}
+    for name, spec in buckets.items():
+        if isinstance(spec,str):
+            spec = {"state":spec}
+        if spec.get("state") not in STATES:
+            raise ValueError("Bucket {} has unknown state {}, use one of {}".format(
+                name,spec.get("state"),",".join(STATES)
+            ))
+        specs[name] = spec
+    return specs
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    PURPOSE: Answer one connection's requests the way S3 would
+    DOCS:
+    |__ Path-style (/bucket/key) works unless the bucket's spec says "addressing": "virtual".
+    |__ Virtual-host style (bucket.<domain>) works when the server was given a domain that
+    |__ resolves to it. Regional path-style (/<region>/bucket/key) is answered as that
+    |__ region's endpoint would.
+    """
+    protocol_version = "HTTP/1.1" # keep-alive, like S3
+    server_version = "AmazonS3"
+    sys_version = ""
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes, Nagle would hold the body back for
+        # the client's delayed ACK (~40 ms on every response with a body)
+        self.connection.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        self.server.count("connections")
+
+    def handle(self):
+        # h2c prior knowledge opens with the HTTP/2 preface instead of a request line
+        try:
+            start = self.connection.recv(3,socket.MSG_PEEK | socket.MSG_WAITALL)
+        except OSError:
+            return
+        if start == PREFACE[:3] and h2 is not None:
+            return HTTP2Connection(self).run()
+        super().handle()
+
+    def log_message(self,format,*args):
+        pass
+
+    def do_HEAD(self):
+        self.answer("HEAD")
+
+    def do_GET(self):
+        self.answer("GET")
+
+    def do_PUT(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.answer("PUT")
+
+    @staticmethod
+    def responseHeaders(body,headers):
+        fields = [("x-amz-request-id","MOCK")] + list(headers.items())
+        if body and "Content-Type" not in headers:
+            fields.append(("Content-Type","application/xml"))
+        fields.append(("Content-Length",str(len(body))))
+        return fields
+
+    def send(self,status,body=b"",headers={}):
+        self.send_response(status)
+        for key, value in self.responseHeaders(body,headers):
+            self.send_header(key,value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def target(self):
+        """
+        PURPOSE: Split the request into bucket, key, query and the region it was sent to
+        RETURN: (bucket, key, query dict, region, True if it was virtual-host style)
+        """
+        url = urlsplit(self.path)
+        query = {k:v[0] for k, v in parse_qs(url.query,keep_blank_values=True).items()}
+        host = (self.headers.get("Host") or "").split(":")[0]
+        domain = self.server.domain
+        if domain and host.endswith("." + domain):
+            return host[:-len(domain) - 1], unquote(url.path.lstrip("/")), query, self.server.region, True
+        path = url.path.lstrip("/")
+        region = self.server.region
+        first, _, rest = path.partition("/")
+        if REGION_SEGMENT.match(first) and rest:
+            region, path = first, rest
+        bucket, _, key = path.partition("/")
+        return bucket, unquote(key), query, region, False
+
+    def answer(self,method):
+        server = self.server
+        server.count("requests")
+        if server.latency:
+            time.sleep(server.latency)
+        if server.throttle():
+            server.count("throttled")
+            return self.send(503,errorBody("SlowDown","Please reduce your request rate."))
+
+        name, key, query, served, virtual = self.target()
+        spec = server.buckets.get(name)
+        if spec is None:
+            return self.send(404,errorBody("NoSuchBucket","The specified bucket does not exist",BucketName=name))
+        region = spec.get("region",server.region)
+        headers = {"x-amz-bucket-region":region}
+        if region != served:
+            server.count("redirects")
+            return self.send(301,errorBody(
+                "PermanentRedirect",
+                "The bucket you are attempting to access must be addressed using the specified endpoint.",
+                Endpoint="{}.s3.{}.amazonaws.com".format(name,region),
+                Bucket=name
+            ),headers)
+        if spec.get("addressing") == "virtual" and not virtual:
+            server.count("redirects")
+            return self.send(301,errorBody(
+                "PermanentRedirect",
+                "The bucket you are attempting to access must be addressed using the specified endpoint.",
+                Endpoint="{}.{}".format(name,server.domain or "s3.{}.amazonaws.com".format(region)),
+                Bucket=name
+            ),headers)
+
+        state = spec["state"]
+        if state == "denied":
+            return self.send(403,errorBody("AccessDenied","Access Denied"),headers)
+        if state == "disabled":
+            return self.send(403,errorBody("AllAccessDisabled","All access to this object has been disabled"),headers)
+
+        if method == "PUT":
+            if state == "writeable":
+                return self.send(200,headers=headers)
+            return self.send(403,errorBody("AccessDenied","Access Denied"),headers)
+        if key:
+            return self.object(spec,key,headers)
+        if method == "HEAD":
+            return self.send(200,headers=headers)
+        for sub in SUBRESOURCES:
+            if sub in query:
+                return self.subresource(sub,region,headers)
+        return self.listing(name,spec,query,headers)
+
+    def object(self,spec,key,headers):
+        if spec["state"] not in ("readable","writeable"):
+            return self.send(403,errorBody("AccessDenied","Access Denied"),headers)
+        if key not in self.server.keys(spec):
+            return self.send(404,errorBody("NoSuchKey","The specified key does not exist.",Key=key),headers)
+        headers = dict(headers,**{"Content-Type":"text/plain","Accept-Ranges":"bytes"})
+        if self.headers.get("Range") == "bytes=0-0":
+            headers["Content-Range"] = "bytes 0-0/{}".format(len(CONTENT))
+            return self.send(206,CONTENT[:1],headers)
+        return self.send(200,CONTENT,headers)
+
+    def subresource(self,name,region,headers):
+        # a public bucket still keeps its configuration to the owner, except the region
+        if name != "location":
+            return self.send(403,errorBody("AccessDenied","Access Denied"),headers)
+        constraint = "" if region == REGION else region
+        return self.send(200,(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<LocationConstraint xmlns="{}">{}</LocationConstraint>'.format(XMLNS,constraint)
+        ).encode(),headers)
+
+    def listing(self,name,spec,query,headers):
+        """
+        PURPOSE: ListObjectsV2 with prefix, delimiter, start-after, max-keys and
+                 continuation tokens
+        """
+        prefix = query.get("prefix","")
+        delimiter = query.get("delimiter","")
+        after = query.get("continuation-token") or query.get("start-after","")
+        maxKeys = max(1,min(int(query.get("max-keys",MAX_KEYS)),MAX_KEYS))
+        contents = []
+        prefixes = []
+        last = None
+        truncated = False
+        for key in self.server.keys(spec):
+            if key <= after or not key.startswith(prefix):
+                continue
+            if len(contents) + len(prefixes) >= maxKeys:
+                truncated = True
+                break
+            if delimiter and delimiter in key[len(prefix):]:
+                common = key[:key.index(delimiter,len(prefix)) + len(delimiter)]
+                if not prefixes or prefixes[-1] != common:
+                    prefixes.append(common)
+                # resume after every key under this prefix
+                last = common + "￿"
+                continue
+            contents.append(
+                "<Contents><Key>{}</Key><LastModified>2020-01-01T00:00:00.000Z</LastModified>"
+                "<ETag>&quot;mock&quot;</ETag><Size>{}</Size><Owner><ID>mock</ID>"
+                "<DisplayName>mock</DisplayName></Owner><StorageClass>STANDARD</StorageClass>"
+                "</Contents>".format(escape(key),len(CONTENT))
+            )
+            last = key
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<ListBucketResult xmlns="{}">'
+            "<Name>{}</Name><Prefix>{}</Prefix><KeyCount>{}</KeyCount><MaxKeys>{}</MaxKeys>"
+            "<IsTruncated>{}</IsTruncated>{}{}{}</ListBucketResult>".format(
+                XMLNS,escape(name),escape(prefix),len(contents) + len(prefixes),maxKeys,
+                "true" if truncated else "false",
+                "<NextContinuationToken>{}</NextContinuationToken>".format(escape(last)) if truncated else "",
+                "".join(contents),
+                "".join("<CommonPrefixes><Prefix>{}</Prefix></CommonPrefixes>".format(escape(p)) for p in prefixes)
+            )
+        )
+        return self.send(200,body.encode(),headers)
+
+class StreamHandler(MockHandler):
+    """
+    PURPOSE: Answer one HTTP/2 stream with MockHandler's logic, keeping the response
+    INPUT: MockS3, method, path, request headers (Host taken from :authority)
+    """
+
+    def __init__(self,server,method,path,headers):
+        self.server = server
+        self.command = method
+        self.path = path
+        self.headers = headers
+        self.response = (500,b"",[])
+
+    def send(self,status,body=b"",headers={}):
+        self.response = (
+            status,
+            body if self.command != "HEAD" else b"",
+            [("server",self.server_version)] + self.responseHeaders(body,headers)
+        )
+
+class HTTP2Connection:
+    """
+    PURPOSE: Serve one h2c connection
+    INPUT: MockHandler that accepted the connection
+    DOCS:
+    |__ The accepting thread feeds the h2 state machine. Each finished request stream is
+    |__ answered on its own thread, so the injected latency of concurrent streams overlaps
+    |__ as it would on S3. Frames are written under one lock, and a response waits there
+    |__ for the client to open its flow control window when needed.
+    """
+
+    def __init__(self,handler):
+        self.server = handler.server
+        self.socket = handler.connection
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False,header_encoding="utf-8")
+        )
+        self.cond = threading.Condition()
+        self.requests = {}
+        self.closed = False
+
+    def flush(self):
+        # caller holds the lock
+        data = self.conn.data_to_send()
+        if data:
+            self.socket.sendall(data)
+
+    def run(self):
+        self.server.count("http2")
+        try:
+            with self.cond:
+                self.conn.initiate_connection()
+                self.conn.update_settings({SettingCodes.MAX_CONCURRENT_STREAMS:MAX_STREAMS})
+                self.flush()
+            while True:
+                data = self.socket.recv(65536)
+                if not data:
+                    return
+                with self.cond:
+                    for event in self.conn.receive_data(data):
+                        if isinstance(event,h2.events.RequestReceived):
+                            self.requests[event.stream_id] = event.headers
+                        elif isinstance(event,h2.events.DataReceived):
+                            self.conn.acknowledge_received_data(event.flow_controlled_length,event.stream_id)
+                        elif isinstance(event,h2.events.StreamEnded):
+                            headers = self.requests.pop(event.stream_id,None)
+                            if headers is not None:
+                                threading.Thread(
+                                    target=self.answer,args=(event.stream_id,headers),daemon=True
+                                ).start()
+                        elif isinstance(event,h2.events.ConnectionTerminated):
+                            return
+                    # window updates may unblock a response
+                    self.cond.notify_all()
+                    self.flush()
+        except (OSError,h2.exceptions.ProtocolError):
+            pass
+        finally:
+            with self.cond:
+                self.closed = True
+                self.cond.notify_all()
+
+    def answer(self,stream,headers):
+        fields = dict(headers)
+        message = HTTPMessage()
+        for name, value in headers:
+            if not name.startswith(":"):
+                message[name] = value
+        if "Host" not in message:
+            message["Host"] = fields.get(":authority","")
+        handler = StreamHandler(self.server,fields.get(":method","GET"),fields.get(":path","/"),message)
+        handler.answer(handler.command)
+        status, body, extra = handler.response
+        with self.cond:
+            try:
+                self.conn.send_headers(
+                    stream,[(":status",str(status))] + [(k.lower(),v) for k, v in extra],end_stream=not body
+                )
+                self.flush()
+                while body and not self.closed:
+                    window = min(self.conn.local_flow_control_window(stream),self.conn.max_outbound_frame_size)
+                    if window <= 0:
+                        self.cond.wait()
+                        continue
+                    chunk, body = body[:window], body[window:]
+                    self.conn.send_data(stream,chunk,end_stream=not body)
+                    self.flush()
+            except (OSError,h2.exceptions.ProtocolError):
+                pass
+
+class MockS3(ThreadingHTTPServer):
+    """
+    PURPOSE: Threaded HTTP server holding the mock bucket state
+    INPUT: (host, port), bucket specs, seconds of latency per request, fraction of
+           requests answered 503 SlowDown, random seed, (optional) virtual-host domain,
+           region this server answers for
+    DOCS:
+    |__[ATTR] BUCKETS
+    |_____ name -> {"state": one of STATES, "objects": N, "region": region, "addressing":
+    |_____ "virtual"}. A bucket in another region, or a virtual-host only bucket asked
+    |_____ path-style, answers with a 301 PermanentRedirect.
+    |__[ATTR] STATS
+    |_____ connections (http2 of them HTTP/2), requests, throttled and redirects served so far
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024 # the default of 5 drops connections from a busy async hunt
+
+    def __init__(self,address,buckets={},latency=0,errorRate=0,seed=0,domain=None,region=REGION):
+        super().__init__(address,MockHandler)
+        self.buckets = normalizeBuckets(buckets)
+        self.latency = latency
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.domain = domain
+        self.region = region
+        self.lock = threading.Lock()
+        self.stats = {"connections":0,"http2":0,"requests":0,"throttled":0,"redirects":0}
+        self.listings = {}
+
+    def count(self,key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def throttle(self):
+        if not self.errorRate:
+            return False
+        with self.lock:
+            return self.random.random() < self.errorRate
+
+    def keys(self,spec):
+        count = spec.get("objects",OBJECTS)
+        keys = self.listings.get(count)
+        if keys is None:
+            keys = self.listings[count] = sorted(
+                "{}/{:07d}.txt".format(FOLDERS[i % len(FOLDERS)],i) for i in range(count)
+            )
+        return keys
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address[:2])
+
+def start(port=0,host="127.0.0.1",**kwargs):
+    """
+    PURPOSE: Run a mock server on a background thread
+    INPUT: Port (0 - any free port), host, any MockS3 keyword arguments
+    RETURN: MockS3, call shutdown() to stop it
+    """
+    server = MockS3((host,port),**kwargs)
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Local stand-in for S3")
+    parser.add_argument("--port", type=int, default=9000,
+        help="Port to listen on (default 9000)")
+    parser.add_argument("--host", default="127.0.0.1",
+        help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--config",
+        help="JSON file of buckets, e.g. {\"buckets\": {\"acme-dev\": \"readable\"}}")
+    parser.add_argument("--latency", type=float, default=0,
+        help="Seconds added to every response (default 0)")
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0,
+        help="Fraction of requests answered with 503 SlowDown (default 0)")
+    parser.add_argument("--seed", type=int, default=0,
+        help="Seed for the injected errors (default 0)")
+    parser.add_argument("--domain",
+        help="Serve virtual-host style requests for <bucket>.<domain> as well")
+    parser.add_argument("--region", default=REGION,
+        help="Region this server answers for, others get redirects (default us-east-1)")
+    args = parser.parse_args()
+
+    try:
+        buckets = loadBuckets(args.config) if args.config else {}
+    except (OSError,ValueError) as e:
+        print(e)
+        sys.exit(1)
+    server = MockS3(
+        (args.host,args.port),buckets,args.latency,args.error_rate,args.seed,args.domain,args.region
+    )
+    print("Mock S3 with {} buckets on {}, endpoint {}/{{bucket}}/".format(len(buckets),server.url,server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Served {requests} requests on {connections} connections".format(**server.stats))
@@ -0,0 +1,93 @@
+#/usr/bin/env python3
+import re
+import zlib
+from functools import lru_cache
+
+# GLOBALS
+# https://docs.aws.amazon.com/AmazonS3/latest/userguide/bucketnamingrules.html
+VALID_NAME = re.compile(r"^[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]$")
+IP_ADDRESS = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$")
+BAD_PREFIXES = ("xn--","sthree-","amzn-s3-demo-")
+BAD_SUFFIXES = ("-s3alias","--ol-s3","--x-s3",".mrap")
+
+# HELPERS
+@lru_cache(maxsize=None)
+def translationTable(badchars):
+    return str.maketrans("","","".join(badchars))
+
+def normalize(name,badchars):
+    return name.lower().translate(translationTable(tuple(badchars)))
+
+def shardOf(name,count):
+    """
+    PURPOSE: Stable shard for a normalized name, the same in every process and on every host
+    INPUT: Normalized bucket name, number of shards
+    RETURN: Shard index from 0 to count-1
+    """
+    return zlib.crc32(name.encode()) % count
+
+def isValidName(name):
+    """
+    PURPOSE: Check a normalized name against the S3 bucket naming rules
+    INPUT: Normalized bucket name
+    RETURN: True if a bucket with this name could exist
+    """
+    if not VALID_NAME.match(name):
+        return False
+    if ".." in name or IP_ADDRESS.match(name):
+        return False
+    return not (name.startswith(BAD_PREFIXES) or name.endswith(BAD_SUFFIXES))
+
+class CandidateFilter:
+    """
+    PURPOSE: Normalize candidates and drop the ones that never need a request
+    INPUT: Characters stripped from every candidate, (optional) (index, count) shard this
+           process is responsible for
+    DOCS:
+    |__[ATTR] SEEN
+    |_____ Every normalized name already passed on during the run
+    |__[ATTR] STATS
+    |_____ candidates: names received from the generator
+    |_____ duplicate: names that normalized to one already queued
+    |_____ invalid: names that break the S3 naming rules
+    |_____ other_shard: names left to another shard, never remembered in SEEN
+    |__[FUNC] filter - generator of normalized, unique, valid names
+    """
+
+    def __init__(self,badchars=[],shard=None):
+        self.badchars = tuple(badchars)
+        self.shard = shard
+        self.seen = set()
+        self.stats = {
+            "candidates":0,
+            "duplicate":0,
+            "invalid":0,
+            "other_shard":0
+        }
+
+    def saved(self):
+        return self.stats['duplicate'] + self.stats['invalid']
+
+    def filter(self,names,tagged=False):
+        """
+        PURPOSE: Stream only the candidates that are worth probing
+        INPUT: Iterable of raw candidate names, or of (name, tag) pairs if tagged
+        RETURN: generator of normalized names, or of (normalized name, tag) pairs
+        """
+        table = translationTable(self.badchars)
+        for name in names:
+            tag = None
+            if tagged:
+                name, tag = name
+            self.stats['candidates'] += 1
+            name = name.lower().translate(table)
+            if self.shard and shardOf(name,self.shard[1]) != self.shard[0]:
+                self.stats['other_shard'] += 1
+            elif name in self.seen:
+                self.stats['duplicate'] += 1
+            elif not isValidName(name):
+                self.stats['invalid'] += 1
+                self.seen.add(name)
+            else:
+                self.seen.add(name)
+                yield (name,tag) if tagged else name
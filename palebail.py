@@ -13,10 +13,21 @@
 
 # IMPORTS
 import sys, time, os
-from argparse import ArgumentParser
+import json, multiprocessing, shutil, tempfile
+from argparse import ArgumentParser, Namespace
+from collections import Counter
+from pathlib import Path
 
-from hunter import Hunter
+from hunter import Hunter, logResults
+from metrics import Metrics
 from logger import Logger
+from transport import Transport, PROBE, DEEP
+from store import ResultStore, TTL
+from sinks import openSink
+from bucket import ENDPOINT, REGIONAL_ENDPOINT, PATH_ENDPOINT, PATH_REGIONAL_ENDPOINT, virtualHost
+from regions import RegionCache
+from scheduler import CandidateScheduler
+from coordinator import Coordinator, WorkerClient, parseAddress, LEASE_SIZE, LEASE_TTL
 
 # GLOBALS
 SILENT = False
@@ -30,8 +41,315 @@ delims = ["<",">","#","%",'"']
 unwise = ["{","}","|","\\","^","[","]","`"," "]
 reserved = [";","/","?",":","@","&","=","+","$",",","."]
 BADCHARS = control+delims+unwise+reserved
+# results are recorded here without --cache, so any run can be resumed
+CACHE = "palebail.db"
 
 
+# HELPERS
+def parseShard(spec):
+    """
+    PURPOSE: Parse a --shard argument
+    INPUT: "i/N" with 1 <= i <= N
+    RETURN: (index, count) with a 0-based index
+    """
+    index, count = (int(part) for part in spec.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(spec)
+    return index - 1, count
+
+def openStore(args):
+    """
+    PURPOSE: Open the database results are recorded to and skipped from
+    INPUT: Parsed arguments
+    RETURN: ResultStore, or None with --no-cache
+    """
+    if args.resume:
+        store = ResultStore(args.cache or CACHE,ttl=None)
+        LOGGER.log("PALEBAIL","STAT","Resuming from {}".format(store.path))
+        return store
+    if args.cache:
+        return ResultStore(args.cache,args.cache_ttl)
+    if args.no_cache:
+        return None
+    # recorded for --resume only, a plain run skips nothing
+    return ResultStore(CACHE,ttl=0)
+
+def hunt(args):
+    """
+    PURPOSE: Run one hunt (or one shard of it) in this process and report it
+    INPUT: Parsed arguments
+    RETURN: 0, or 1 if the hunt stopped on an error
+    """
+    try:
+        sinks = [openSink(spec,LOGGER) for spec in args.results]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    store = openStore(args)
+
+    # a worker's candidates come from its coordinator
+    hunter = Hunter(
+        None if args.worker else args.modifiers,
+        args.keyword,
+        None if args.worker else args.wordlist,
+        args.threads,
+        LOGGER
+    )
+
+    # Main sequence and exception handling
+    failed = False
+    try:
+        hunter.useragent = args.useragent
+        hunter.COMBINATORS = COMBINATORS
+        hunter.BADCHARS = BADCHARS
+        hunter.require_proxy = args.require_proxy
+        hunter.engine = args.engine
+        hunter.endpoint = args.endpoint
+        hunter.regional = args.regional_endpoint
+        hunter.fallback = args.fallback
+        # regions live next to the cached results, unless told otherwise
+        hunter.regions = RegionCache(args.region_cache,None if args.region_cache else store)
+        hunter.shard = args.shard
+        if args.prioritize and not args.worker:
+            # hit rates live next to the cached results, unless told otherwise
+            hunter.scheduler = CandidateScheduler(args.priors,None if args.priors else store)
+        hunter.maxRequests = max(0,args.max_requests)
+        hunter.transport = Transport(args.poolsize,args.connect_timeout,args.read_timeout)
+        if args.http2 and not hunter.transport.useHTTP2():
+            LOGGER.log("PALEBAIL","WARN","httpx[http2] is not installed, staying on HTTP/1.1")
+        hunter.transport.setBudget("total",args.max_rps)
+        hunter.transport.setBudget(PROBE,args.probe_rps)
+        hunter.transport.setBudget(DEEP,args.deep_rps)
+        hunter.setConcurrency(args.concurrency)
+        hunter.store = store
+        hunter.sinks = sinks
+        hunter.backoff = args.backoff
+        hunter.setSubresources(args.metadata)
+        hunter.maxObjects = args.max_objects
+        hunter.maxBytes = args.max_listing_bytes
+        hunter.maxSeconds = args.max_listing_time
+        hunter.listContents = args.list_contents
+        hunter.sample = max(1,args.sample)
+        hunter.deepList = args.deep_list
+        hunter.listWorkers = max(1,args.list_workers)
+        hunter.progress = max(0,args.progress)
+        hunter.metricsPath = args.metrics
+        hunter.metricsInterval = max(0,args.metrics_interval)
+        if args.worker:
+            WorkerClient(parseAddress(args.worker),hunter,LOGGER,args.lease_size).run()
+        else:
+            hunter.hunt()
+    except KeyboardInterrupt:
+        LOGGER.log("PALEBAIL","ERRO","User interrupt")
+    except Exception as e:
+        failed = True
+        LOGGER.log("PALEBAIL","ERRO",e)
+    finally:
+        hunter.report()
+        hunter.status()
+        if hunter.require_proxy:
+            for aid in hunter.active:
+                try:
+                    hunter.fp.delete_api(aid)
+                    hunter.fp.list_api(aid)
+                except:
+                    pass
+        if hunter.scheduler:
+            hunter.scheduler.close()
+        if store:
+            store.close()
+        hunter.regions.close()
+        for sink in sinks:
+            sink.close()
+            LOGGER.log("PALEBAIL","STAT","{} findings written to {}".format(sink.written,sink.path))
+            failed = failed or sink.lost > 0
+        if args.metrics:
+            try:
+                hunter.transport.metrics.export(args.metrics,hunter.counters())
+                LOGGER.log("PALEBAIL","STAT","Metrics written to {0}.json and {0}.prom".format(args.metrics))
+            except OSError as e:
+                LOGGER.log("PALEBAIL","ERRO","Unable to write metrics: {}".format(e))
+        LOGGER.log("PALEBAIL","STAT","Shutting down.")
+        LOGGER.cleanup()
+        return 1 if failed else 0
+
+
+def huntShard(args,shard,directory):
+    """
+    PURPOSE: Entry point of a local shard process, findings and metrics go to the
+             scratch directory for the parent to merge
+    INPUT: Parsed arguments, (index, count) shard, scratch directory
+    RETURN: None, the process exits with the hunt's return code
+    """
+    global LOGGER
+    name = "shard-{}-of-{}".format(shard[0] + 1,shard[1])
+    LOGGER = Logger(1,Path("logs","{}-{}.log".format(int(time.time()),name)))
+    LOGGER.initLogFile()
+    args = Namespace(**vars(args))
+    args.shard = shard
+    args.results = ["jsonl:{}".format(Path(directory,name + ".jsonl"))]
+    args.metrics = str(Path(directory,name))
+    args.metrics_interval = 0
+    args.progress = 0
+    # the host's request budget is split between its shards
+    args.max_requests = -(-args.max_requests // args.processes)
+    sys.exit(hunt(args))
+
+def huntShards(args):
+    """
+    PURPOSE: Split the hunt into args.processes shards on local processes, then merge
+             their findings into the result sinks and their counters into one report
+    INPUT: Parsed arguments, args.shard (if any) is split further
+    RETURN: 0, or 1 if any shard failed
+    """
+    try:
+        sinks = [openSink(spec,LOGGER) for spec in args.results]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    # shard k of a host's i/N is i + N*k of N*processes, so hosts never overlap
+    index, count = args.shard or (0,1)
+    shards = [(index + count * k,count * args.processes) for k in range(args.processes)]
+    directory = tempfile.mkdtemp(prefix="palebail-shards-")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=huntShard,args=(args,shard,directory)) for shard in shards]
+    LOGGER.log("PALEBAIL","STAT","Running {} shards in {} processes".format(len(shards),len(workers)))
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        LOGGER.log("PALEBAIL","ERRO","User interrupt, waiting for shards to report")
+        for worker in workers:
+            worker.join()
+
+    metrics = Metrics()
+    counters = Counter()
+    records = []
+    failed = []
+    for shard, worker in zip(shards,workers):
+        name = "shard-{}-of-{}".format(shard[0] + 1,shard[1])
+        if worker.exitcode != 0:
+            # its partial results are still merged below, but the hunt is incomplete
+            failed.append(name)
+            LOGGER.log("PALEBAIL","ERRO","Shard {} failed (exit code {}), see its log in ./logs/".format(
+                name,worker.exitcode
+            ))
+        try:
+            with open(Path(directory,name + ".json"),"r") as f:
+                summary = json.load(f)
+            with open(Path(directory,name + ".jsonl"),"r") as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+        except (OSError,ValueError):
+            LOGGER.log("PALEBAIL","ERRO","Shard {} left no results (exit code {})".format(name,worker.exitcode))
+            continue
+        metrics.absorb(summary)
+        counters.update(summary['counters'])
+
+    for sink in sinks:
+        for record in records:
+            sink.write(record)
+        sink.close()
+        LOGGER.log("PALEBAIL","STAT","{} findings written to {}".format(sink.written,sink.path))
+    logResults(
+        LOGGER,
+        counters,
+        metrics.summary()['stages'],
+        [record['name'] for record in records if record['download']],
+        [record['name'] for record in records if record['write']]
+    )
+    if args.metrics:
+        try:
+            metrics.export(args.metrics,dict(counters))
+            LOGGER.log("PALEBAIL","STAT","Metrics written to {0}.json and {0}.prom".format(args.metrics))
+        except OSError as e:
+            LOGGER.log("PALEBAIL","ERRO","Unable to write metrics: {}".format(e))
+    shutil.rmtree(directory,ignore_errors=True)
+    if failed:
+        LOGGER.log("PALEBAIL","ERRO","{} of {} shards failed, results are incomplete: {}".format(
+            len(failed),len(shards),", ".join(failed)
+        ))
+    LOGGER.log("PALEBAIL","STAT","Shard logs are in ./logs/, shutting down.")
+    LOGGER.cleanup()
+    return 1 if failed else 0
+
+def coordinate(args):
+    """
+    PURPOSE: Lease the candidates out to --worker processes, then merge what they
+             found into the result sinks and one report
+    INPUT: Parsed arguments
+    RETURN: 0
+    """
+    try:
+        sinks = [openSink(spec,LOGGER) for spec in args.results]
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    store = openStore(args)
+
+    # only generates candidates, the workers probe them
+    hunter = Hunter(
+        args.modifiers,
+        args.keyword,
+        args.wordlist,
+        args.threads,
+        LOGGER
+    )
+    hunter.COMBINATORS = COMBINATORS
+    hunter.BADCHARS = BADCHARS
+    hunter.shard = args.shard
+    hunter.store = store
+    if args.prioritize:
+        hunter.scheduler = CandidateScheduler(args.priors,None if args.priors else store)
+    coordinator = Coordinator(hunter,LOGGER,args.lease_size,args.lease_ttl)
+    try:
+        coordinator.serve(parseAddress(args.coordinator))
+    except KeyboardInterrupt:
+        LOGGER.log("PALEBAIL","ERRO","User interrupt")
+    except OSError as e:
+        LOGGER.log("PALEBAIL","ERRO","Unable to serve workers: {}".format(e))
+
+    metrics = Metrics()
+    for state in coordinator.workers.values():
+        if state['metrics']:
+            metrics.absorb(state['metrics'])
+    records = coordinator.findings()
+    counters = coordinator.counters()
+    for sink in sinks:
+        for record in records:
+            sink.write(record)
+        sink.close()
+        LOGGER.log("PALEBAIL","STAT","{} findings written to {}".format(sink.written,sink.path))
+    LOGGER.log("COORDINATOR","STAT","{workers} workers, {leases} leases, {expired} expired, {stolen} names stolen".format(
+        workers=len(coordinator.workers),**coordinator.stats
+    ))
+    logResults(
+        LOGGER,
+        counters,
+        metrics.summary()['stages'],
+        [record['name'] for record in records if record['download']],
+        [record['name'] for record in records if record['write']]
+    )
+    if hunter.scheduler:
+        LOGGER.log("HUNTER","STAT","Prioritization: {}".format(hunter.scheduler.report()))
+    if args.metrics:
+        try:
+            metrics.export(args.metrics,counters)
+            LOGGER.log("PALEBAIL","STAT","Metrics written to {0}.json and {0}.prom".format(args.metrics))
+        except OSError as e:
+            LOGGER.log("PALEBAIL","ERRO","Unable to write metrics: {}".format(e))
+    if hunter.scheduler:
+        hunter.scheduler.close()
+    if store:
+        store.close()
+    LOGGER.log("PALEBAIL","STAT","Shutting down.")
+    LOGGER.cleanup()
+    return 0
+
 # MAIN
 def main():
     global SILENT, VERBOSE, COMBINATORS, LOGGER
@@ -58,6 +376,187 @@ def main():
         help="""Number of threads to use""",
         default="1",
         metavar="threads")
+    parser.add_argument("-e", "--engine", dest="engine",
+        help="""Probe engine: thread (default) or async (requires aiohttp)""",
+        choices=["thread","async"],
+        default="thread",
+        metavar="engine")
+    parser.add_argument("-c", "--concurrency", dest="concurrency",
+        help="""Number of in-flight probes for the async engine""",
+        default="500",
+        metavar="concurrency")
+    parser.add_argument("--addressing", dest="addressing",
+        help="""virtual (default): https://<bucket>.s3.amazonaws.com/, a new connection per
+        candidate; path: https://s3.amazonaws.com/<bucket>/, every candidate shares a few
+        keep-alive connections, buckets that need it fall back to virtual-host""",
+        choices=["virtual","path"],
+        default="virtual",
+        metavar="style")
+    parser.add_argument("--endpoint", dest="endpoint",
+        help="""S3 URL template, {bucket} is replaced with the candidate name (default
+        https://{bucket}.s3.amazonaws.com/, or https://s3.amazonaws.com/{bucket}/ with
+        --addressing path, which also accepts a base URL like http://localhost:9000)""",
+        metavar="url")
+    parser.add_argument("--regional-endpoint", dest="regional_endpoint",
+        help="""URL template for buckets whose region is known, {bucket} and {region} are
+        replaced (default https://{bucket}.s3.{region}.amazonaws.com/ with the default
+        --endpoint, otherwise none)""",
+        metavar="url")
+    parser.add_argument("--region-cache", dest="region_cache",
+        help="""SQLite file to remember bucket regions in between runs (default the --cache
+        file, or palebail.db)""",
+        metavar="path")
+    parser.add_argument("--http2", dest="http2",
+        help="""Multiplex bucket requests as HTTP/2 streams over one connection per host,
+        falling back to HTTP/1.1 per host (requires httpx[http2], async engine probes stay on aiohttp)""",
+        action="store_true")
+    parser.add_argument("--pool-size", dest="poolsize",
+        help="""Keep-alive connections pooled per worker (default 10)""",
+        type=int,
+        default=10,
+        metavar="poolsize")
+    parser.add_argument("--connect-timeout", dest="connect_timeout",
+        help="""Seconds to wait for a connection (default 3)""",
+        type=float,
+        default=3,
+        metavar="seconds")
+    parser.add_argument("--read-timeout", dest="read_timeout",
+        help="""Seconds to wait for a response (default 3)""",
+        type=float,
+        default=3,
+        metavar="seconds")
+    parser.add_argument("--metadata", dest="metadata",
+        help="""Bucket subresources to collect: comma separated list from acl,accelerate,cors,
+        encryption,location,logging,policy,replication,website, or all/none (default all)""",
+        default="all",
+        metavar="subresources")
+    parser.add_argument("--sample", dest="sample",
+        help="""Objects per open bucket to check for readability, concurrently (default 1)""",
+        type=int,
+        default=1,
+        metavar="count")
+    parser.add_argument("--max-objects", dest="max_objects",
+        help="""Most objects listed per bucket with --list (default 1000)""",
+        type=int,
+        default=1000,
+        metavar="count")
+    parser.add_argument("--max-listing-bytes", dest="max_listing_bytes",
+        help="""Most listing bytes read per bucket with --list (default 52428800)""",
+        type=int,
+        default=52428800,
+        metavar="bytes")
+    parser.add_argument("--max-listing-time", dest="max_listing_time",
+        help="""Most seconds spent listing a bucket with --list (default 60)""",
+        type=float,
+        default=60,
+        metavar="seconds")
+    parser.add_argument("-l", "--list", dest="list_contents",
+        help="""List the full contents of open buckets (default only the first key)""",
+        action="store_true")
+    parser.add_argument("--deep-list", dest="deep_list",
+        help="""Like --list, with prefixes partitioned across --list-workers threads""",
+        action="store_true")
+    parser.add_argument("--list-workers", dest="list_workers",
+        help="""Threads listing prefixes concurrently in --deep-list mode (default 8)""",
+        type=int,
+        default=8,
+        metavar="threads")
+    parser.add_argument("--max-rps", dest="max_rps",
+        help="""Cap on requests per second across every request (default unlimited)""",
+        type=float,
+        metavar="rps")
+    parser.add_argument("--probe-rps", dest="probe_rps",
+        help="""Cap on existence probes per second (default unlimited)""",
+        type=float,
+        metavar="rps")
+    parser.add_argument("--deep-rps", dest="deep_rps",
+        help="""Cap on listing, readability and metadata requests per second (default unlimited)""",
+        type=float,
+        metavar="rps")
+    parser.add_argument("--backoff", dest="backoff",
+        help="""Seconds to hold new probes after S3 throttles us (default 1)""",
+        type=float,
+        default=1.0,
+        metavar="seconds")
+    parser.add_argument("--metrics", dest="metrics",
+        help="""Write request latency histograms and byte counts to <prefix>.json and
+        <prefix>.prom (Prometheus text format) at shutdown""",
+        metavar="prefix")
+    parser.add_argument("--metrics-interval", dest="metrics_interval",
+        help="""Also rewrite the --metrics files every N seconds while hunting (default only at shutdown)""",
+        type=float,
+        default=0,
+        metavar="seconds")
+    parser.add_argument("--cache", dest="cache",
+        help="""SQLite file to store results in, fresh results are skipped on later runs
+        (without it, results are still recorded to palebail.db for --resume, but never skipped)""",
+        metavar="cache")
+    parser.add_argument("--no-cache", dest="no_cache",
+        help="""Don't record results to palebail.db""",
+        action="store_true")
+    parser.add_argument("--cache-ttl", dest="cache_ttl",
+        help="""Seconds a cached result stays fresh (default 86400)""",
+        type=float,
+        default=TTL,
+        metavar="seconds")
+    parser.add_argument("--resume", dest="resume",
+        help="""Continue an interrupted scan, skipping every stored result (default cache palebail.db)""",
+        action="store_true")
+    parser.add_argument("--prioritize", dest="prioritize",
+        help="""Probe the candidates whose modifier, combinator and prefix/suffix position
+        have found the most buckets first, learning as results come in""",
+        action="store_true")
+    parser.add_argument("--priors", dest="priors",
+        help="""SQLite file to keep --prioritize hit rates in between runs (default the --cache file, or palebail.db)""",
+        metavar="priors")
+    parser.add_argument("--max-requests", dest="max_requests",
+        help="""Stop queuing new candidates once this many requests are sent (default unlimited)""",
+        type=int,
+        default=0,
+        metavar="requests")
+    parser.add_argument("-r", "--results", dest="results",
+        help="""Stream findings to a file as they are found: *.jsonl, *.csv, *.db, or
+        jsonl:/csv:/sqlite:<path> (may be repeated)""",
+        action="append",
+        default=[],
+        metavar="results")
+    parser.add_argument("--progress", dest="progress",
+        help="""Show a live progress line on stderr, redrawn every N seconds (default 1)""",
+        type=float,
+        nargs="?",
+        const=1.0,
+        default=0,
+        metavar="seconds")
+    parser.add_argument("--shard", dest="shard",
+        help="""Only probe shard i of N (1 <= i <= N) of the candidates, split by a stable
+        hash of the name so N hosts never probe the same bucket""",
+        metavar="i/N")
+    parser.add_argument("--processes", dest="processes",
+        help="""Split the hunt (or its --shard) into N shards on N local processes and
+        merge their results (default 1)""",
+        type=int,
+        default=1,
+        metavar="N")
+    parser.add_argument("--coordinator", dest="coordinator",
+        help="""Do not probe, lease the candidates out to --worker processes on other hosts
+        and merge their results (default port 8642)""",
+        nargs="?",
+        const="0.0.0.0",
+        metavar="[host:]port")
+    parser.add_argument("--worker", dest="worker",
+        help="""Probe candidates leased from the --coordinator at host:port instead of the
+        local wordlists, the coordinator's -k/-m/-w are used""",
+        metavar="host:port")
+    parser.add_argument("--lease-size", dest="lease_size",
+        help="""Candidates per lease in --coordinator/--worker mode (default 200)""",
+        type=int,
+        default=LEASE_SIZE,
+        metavar="count")
+    parser.add_argument("--lease-ttl", dest="lease_ttl",
+        help="""Seconds a silent worker keeps its leases before they are re-issued (default 30)""",
+        type=float,
+        default=LEASE_TTL,
+        metavar="seconds")
     parser.add_argument("-s", "--silent", dest="silent",
         help="""Silent mode - only prints Found buckets""",
         action="store_true")
@@ -73,7 +572,7 @@ def main():
 
     args = parser.parse_args()
 
-    if (args.keyword == "" and args.wordlist == "") or len(sys.argv) == 1:
+    if (args.keyword == "" and args.wordlist == "" and not args.worker) or len(sys.argv) == 1:
         print(
             "Palebail must be run with at least a keyword/wordlist (-k / -w)\n"+
             "Use -h or --help for help"
@@ -91,40 +590,52 @@ def main():
         LOGGER.verbosity = 3
     LOGGER.log("PALEBAIL","STAT","Starting up Palebail")
 
-    hunter = Hunter(
-        args.modifiers,
-        args.keyword,
-        args.wordlist,
-        args.threads,
-        LOGGER
-    )
-
-    # Main sequence and exception handling
-    try:
-        hunter.useragent = args.useragent
-        hunter.COMBINATORS = COMBINATORS
-        hunter.BADCHARS = BADCHARS
-        hunter.require_proxy = args.require_proxy
-        hunter.hunt()
-    except KeyboardInterrupt:
-        LOGGER.log("PALEBAIL","ERRO","User interrupt")
-    except Exception as e:
-        LOGGER.log("PALEBAIL","ERRO",e)
-    finally:
-        hunter.report()
-        hunter.status()
-        if hunter.require_proxy:
-            for aid in hunter.active:
-                try:
-                    hunter.fp.delete_api(aid)
-                    hunter.fp.list_api(aid)
-                except:
-                    pass
-        LOGGER.log("PALEBAIL","STAT","Shutting down.")
-        LOGGER.cleanup()
-        return 0
+    if args.endpoint is None:
+        args.endpoint = PATH_ENDPOINT if args.addressing == "path" else ENDPOINT
+    elif args.addressing == "path" and "{bucket}" not in args.endpoint:
+        args.endpoint = args.endpoint.rstrip("/") + "/{bucket}/"
+    if "{bucket}" not in args.endpoint:
+        print("Endpoint {} has no {{bucket}} placeholder".format(args.endpoint))
+        sys.exit(1)
+    if args.regional_endpoint is None and args.endpoint in (ENDPOINT,PATH_ENDPOINT):
+        args.regional_endpoint = REGIONAL_ENDPOINT if args.endpoint == ENDPOINT else PATH_REGIONAL_ENDPOINT
+    if args.regional_endpoint and not all(p in args.regional_endpoint for p in ("{bucket}","{region}")):
+        print("Regional endpoint {} needs {{bucket}} and {{region}} placeholders".format(args.regional_endpoint))
+        sys.exit(1)
+    # where a path-style bucket goes when the endpoint won't serve it path-style
+    args.fallback = None
+    if args.addressing == "path" and virtualHost(args.endpoint):
+        args.fallback = (virtualHost(args.endpoint),virtualHost(args.regional_endpoint))
 
+    if args.shard:
+        try:
+            args.shard = parseShard(args.shard)
+        except ValueError:
+            print("Shard {} is not i/N with 1 <= i <= N".format(args.shard))
+            sys.exit(1)
+    if args.coordinator and args.worker:
+        print("--coordinator and --worker cannot be used together")
+        sys.exit(1)
+    if args.resume:
+        path = args.cache or CACHE
+        if args.no_cache and not args.cache:
+            print("--resume needs the results of an earlier run, drop --no-cache")
+            sys.exit(1)
+        if not os.path.exists(path):
+            print("Nothing to resume, {} does not exist".format(path))
+            sys.exit(1)
+        store = ResultStore(path,ttl=None)
+        stored = store.count()
+        store.close()
+        if not stored:
+            print("Nothing to resume, {} holds no results".format(path))
+            sys.exit(1)
+    if args.coordinator:
+        return coordinate(args)
+    if args.processes > 1:
+        return huntShards(args)
+    return hunt(args)
 
 if __name__ == "__main__":
     LOGGER = Logger()
-    main()
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#/usr/bin/env python3
+import sys
+import threading
+import time
+
+# GLOBALS
+REFRESH = 1.0 # seconds between redraws
+
+# HELPERS
+def formatSeconds(seconds):
+    """
+    PURPOSE: Short human readable duration for the ETA
+    INPUT: Seconds, or None if unknown
+    RETURN: String like "1h02m", "4m05s" or "?"
+    """
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "{}h{:02d}m".format(seconds // 3600,seconds % 3600 // 60)
+    if seconds >= 60:
+        return "{}m{:02d}s".format(seconds // 60,seconds % 60)
+    return "{}s".format(seconds)
+
+class Progress:
+    """
+    PURPOSE: Redraw a one-line summary of a running hunt on stderr
+    INPUT: Hunter, seconds between redraws
+    DOCS:
+    |__ Reads the hunter's counters from its own thread, so workers never wait on it.
+    |__ Line: candidates generated/estimated, probed, requests per second over the last
+    |__ refresh, status breakdown, queued candidates and ETA from the probe rate so far.
+    |__[FUNC] start / stop
+    """
+
+    def __init__(self,hunter,interval=REFRESH,stream=sys.stderr):
+        self.hunter = hunter
+        self.interval = interval
+        self.stream = stream
+        self.width = 0
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run,daemon=True)
+        self.started = time.monotonic()
+        self.lastTime = self.started
+        self.lastRequests = 0
+
+    def start(self):
+        self.started = time.monotonic()
+        self.lastTime = self.started
+        self.lastRequests = self.hunter.transport.stats['requests']
+        self.thread.start()
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+        self.draw()
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.draw()
+
+    def line(self):
+        hunter = self.hunter
+        counts = hunter.metadata.snapshot()
+        now = time.monotonic()
+        requests = hunter.transport.stats['requests']
+        rps = (requests - self.lastRequests) / max(now - self.lastTime,1e-6)
+        self.lastTime, self.lastRequests = now, requests
+
+        generated = hunter.filter.stats['candidates']
+        estimate = hunter.estimate()
+        probed = counts['total']
+        skipped = hunter.filter.saved() + (hunter.store.stats['skipped'] if hunter.store else 0)
+        remaining = max(estimate - probed - skipped,0)
+        rate = probed / max(now - self.started,1e-6)
+        eta = remaining / rate if rate > 0 else None
+
+        return "[PROGRESS] candidates {}/{} | probed {} | {:.1f} req/s | " \
+            "nx {} denied {} disabled {} open {} read {} write {} throttled {} | " \
+            "queue {} | ETA {}".format(
+                generated,estimate,probed,rps,
+                counts['nonexist'],counts['denied'],counts['disabled'],
+                counts['open_list'],counts['open_read'],counts['open_write'],counts['rate_limits'],
+                hunter.queueDepth(),formatSeconds(eta)
+            )
+
+    def draw(self):
+        line = self.line()
+        self.stream.write("\r" + line.ljust(self.width))
+        self.stream.flush()
+        self.width = len(line)
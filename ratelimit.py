@@ -0,0 +1,43 @@
+#/usr/bin/env python3
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """
+    PURPOSE: Hold a request rate to a fixed budget across every thread and the event loop
+    INPUT: Allowed requests per second, burst size (default 1, strict pacing so no
+           one-second window ever goes over the budget)
+    DOCS:
+    |__[ATTR] TOKENS
+    |_____ Requests that may be sent right now. A caller that finds none still takes one
+    |_____ and goes into debt, then sleeps until the debt is paid off, so callers are
+    |_____ served in order and the lock is never held while sleeping.
+    |__[FUNC] reserve - take a token, return seconds to wait before using it
+    |__[FUNC] take / takeAsync - take a token and wait for it
+    """
+
+    def __init__(self,rate,burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst else 1.0
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def takeAsync(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
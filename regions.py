@@ -0,0 +1,111 @@
+#/usr/bin/env python3
+import re
+import sqlite3
+import threading
+import time
+
+from counters import ShardedCounter
+from store import TIMEOUT
+
+# GLOBALS
+GLOBAL_REGION = "us-east-1" # the region the global endpoint answers for without a redirect
+# <name>.s3.eu-west-1.amazonaws.com, or the older <name>.s3-eu-west-1.amazonaws.com
+ENDPOINT_REGION = re.compile(r"(?:^|\.)s3[.-]([a-z0-9-]+)\.amazonaws\.com")
+
+# HELPERS
+def regionFromEndpoint(endpoint):
+    """
+    PURPOSE: Pull the region out of the <Endpoint> host of a redirect body
+    INPUT: Endpoint host name
+    RETURN: Region, or None if the host names no region
+    """
+    match = ENDPOINT_REGION.search(endpoint or "")
+    if match is None or match.group(1) in ("external-1","accelerate"):
+        return None
+    return match.group(1)
+
+class RegionCache:
+    """
+    PURPOSE: Remember the region of every bucket seen, so later requests (in this run or
+             a later one) go straight to the bucket's regional endpoint
+    INPUT: (optional) path to a SQLite database to keep the regions in between runs, or
+           a ResultStore to share the database connection of
+    DOCS:
+    |__[ATTR] REGIONS TABLE
+    |_____ name: normalized bucket name (primary key)
+    |_____ region: region reported by S3
+    |_____ seen: epoch time it was last reported
+    |__[ATTR] STATS
+    |_____ learned: regions discovered (or changed) during this run
+    |_____ cached: buckets whose region was known before their first request
+    |_____ saved: requests sent to a regional endpoint, each one a redirect the global
+    |_____        endpoint would have answered with
+    |__[FUNC] lookup, record, saved, close
+    """
+
+    def __init__(self,path=None,store=None):
+        self.path = store.path if store else path
+        self.regions = {}
+        self.lock = store.lock if store else threading.Lock()
+        self.stats = ShardedCounter(["learned","cached","saved"])
+        self.db = None
+        # one connection (and lock) per file in this process, shared with the store
+        self.shared = store is not None
+        if store:
+            self.db = store.db
+        elif path:
+            self.db = sqlite3.connect(path,timeout=TIMEOUT,check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        if self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS regions ("
+                "name TEXT PRIMARY KEY, region TEXT, seen REAL)"
+            )
+            self.db.commit()
+
+    def lookup(self,name):
+        """
+        PURPOSE: Find the known region of a bucket
+        INPUT: Normalized bucket name
+        RETURN: Region, or None if the bucket was never seen
+        """
+        with self.lock:
+            region = self.regions.get(name)
+            if region is None and self.db:
+                row = self.db.execute("SELECT region FROM regions WHERE name=?",(name,)).fetchone()
+                if row:
+                    region = self.regions[name] = row[0]
+        if region is not None:
+            self.stats.incr('cached')
+        return region
+
+    def record(self,name,region):
+        """
+        PURPOSE: Remember a region reported by S3
+        INPUT: Normalized bucket name, region
+        RETURN: None
+        """
+        with self.lock:
+            if self.regions.get(name) == region:
+                return
+            self.regions[name] = region
+            if self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO regions VALUES (?,?,?)",(name,region,time.time())
+                )
+                # committed at once, like the store's writes, so other processes never wait on it
+                self.db.commit()
+        self.stats.incr('learned')
+
+    def saved(self):
+        self.stats.incr('saved')
+
+    def close(self):
+        if self.shared:
+            return # committed and closed with the store
+        with self.lock:
+            if self.db:
+                self.db.commit()
+                self.db.close()
+                self.db = None
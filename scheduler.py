@@ -0,0 +1,242 @@
+#/usr/bin/env python3
+import heapq
+import random
+import sqlite3
+import threading
+from itertools import count
+
+from store import TIMEOUT
+
+# GLOBALS
+PREFIX = "prefix" # modifier before the keyword, e.g. dev-acme
+SUFFIX = "suffix" # modifier after the keyword, e.g. acme-dev
+WINDOW = 2048 # candidates read ahead of the workers, the next one is chosen among them
+BASE_RATE = 0.01 # hit rate assumed for a pattern nothing is known about yet
+PRIOR = 20 # pseudo-candidates pulling a rate toward BASE_RATE until real results outweigh them
+KINDS = ("modifier","combinator","position")
+
+# HELPERS
+def hitRate(hits,tries):
+    return (hits + PRIOR * BASE_RATE) / (tries + PRIOR)
+
+class CandidateScheduler:
+    """
+    PURPOSE: Hand out the candidates whose patterns have found the most buckets first
+    INPUT: (optional) path to a SQLite database to keep hit rates in between runs, or a
+           ResultStore to share the database connection of, random seed
+    DOCS:
+    |__ Every candidate is a keyword joined to a modifier with a combinator, the modifier
+    |__ either before (PREFIX) or after (SUFFIX) it. Hits (buckets that exist) and tries
+    |__ are counted per modifier, per combinator and per position as results come in.
+    |__[ATTR] LANES
+    |_____ One heap of waiting candidates per (combinator, position), best modifier first.
+    |_____ The next candidate comes from the lane whose sampled combinator and position
+    |_____ rates times its best modifier's rate is highest. Sampling (Thompson) keeps
+    |_____ trying patterns that haven't hit yet, instead of only the first one that did.
+    |__[ATTR] PRIORS TABLE
+    |_____ kind: modifier, combinator or position
+    |_____ value: the modifier, combinator or position itself
+    |_____ hits, tries: summed over every earlier run, added to this run's counts
+    |__[ATTR] STATS
+    |_____ scheduled: candidates handed out
+    |_____ recorded: results counted, hits: how many of them were buckets
+    |__[FUNC] schedule, rank, done, record, report, close
+    """
+
+    def __init__(self,path=None,store=None,seed=None):
+        self.path = store.path if store else path
+        self.lock = threading.Lock()
+        self.dblock = store.lock if store else threading.Lock()
+        self.random = random.Random(seed)
+        self.prior = {kind:{} for kind in KINDS}
+        self.run = {kind:{} for kind in KINDS}
+        self.lanes = {}
+        self.waiting = {} # modifier -> {name: (lane, pattern)} not handed out yet
+        self.versions = {} # modifier -> results counted, stale heap entries have an older one
+        self.inflight = {} # name -> pattern, handed out but not done
+        self.order = count()
+        self.stats = {"scheduled":0,"recorded":0,"hits":0}
+        self.db = None
+        # one connection (and lock) per file in this process, shared with the store
+        self.shared = store is not None
+        if store:
+            self.db = store.db
+        elif path:
+            self.db = sqlite3.connect(path,timeout=TIMEOUT,check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+        if self.db:
+            with self.dblock:
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS priors ("
+                    "kind TEXT, value TEXT, hits INTEGER, tries INTEGER, PRIMARY KEY (kind, value))"
+                )
+                self.db.commit()
+                for kind, value, hits, tries in self.db.execute("SELECT kind, value, hits, tries FROM priors"):
+                    if kind in self.prior:
+                        self.prior[kind][value] = [hits,tries]
+
+    def counts(self,kind,value):
+        # caller holds the lock
+        prior = self.prior[kind].get(value,(0,0))
+        run = self.run[kind].get(value,(0,0))
+        return prior[0] + run[0], prior[1] + run[1]
+
+    def rate(self,kind,value):
+        return hitRate(*self.counts(kind,value))
+
+    def sample(self,kind,value):
+        hits, tries = self.counts(kind,value)
+        return self.random.betavariate(
+            hits + PRIOR * BASE_RATE,max(tries - hits,0) + PRIOR * (1 - BASE_RATE)
+        )
+
+    def rank(self,modifiers):
+        """
+        PURPOSE: Order the modifiers by hit rate, so the candidates are generated best
+                 first (ties keep the wordlist order)
+        INPUT: List of modifiers
+        RETURN: Sorted list of modifiers
+        """
+        with self.lock:
+            return sorted(modifiers,key=lambda modifier: -self.rate("modifier",modifier))
+
+    def push(self,modifier,name,lane,pattern):
+        # caller holds the lock
+        heapq.heappush(self.lanes.setdefault(lane,[]),(
+            -self.rate("modifier",modifier),next(self.order),self.versions.get(modifier,0),name,pattern
+        ))
+
+    def add(self,name,pattern):
+        # caller holds the lock
+        modifier, combinator, position = pattern
+        lane = (combinator,position)
+        self.waiting.setdefault(modifier,{})[name] = (lane,pattern)
+        self.push(modifier,name,lane,pattern)
+
+    def top(self,heap):
+        # caller holds the lock, drops entries queued again since with a newer rate
+        while heap:
+            rate, _, version, name, pattern = heap[0]
+            if version == self.versions.get(pattern[0],0):
+                return -rate
+            heapq.heappop(heap)
+        return None
+
+    def pop(self):
+        # caller holds the lock
+        best, choice = None, None
+        for lane, heap in self.lanes.items():
+            rate = self.top(heap)
+            if rate is None:
+                continue
+            score = self.sample("combinator",lane[0]) * self.sample("position",lane[1]) * rate
+            if best is None or score > best:
+                best, choice = score, heap
+        if choice is None:
+            return None
+        _, _, _, name, pattern = heapq.heappop(choice)
+        waiting = self.waiting[pattern[0]]
+        del waiting[name]
+        if not waiting:
+            del self.waiting[pattern[0]]
+        self.inflight[name] = pattern
+        self.stats['scheduled'] += 1
+        return name
+
+    def schedule(self,candidates):
+        """
+        PURPOSE: Reorder a stream of candidates, keeping up to WINDOW of them waiting
+        INPUT: Iterable of (name, (modifier, combinator, position))
+        RETURN: generator of names
+        """
+        waiting = 0
+        for name, pattern in candidates:
+            with self.lock:
+                self.add(name,pattern)
+                waiting += 1
+                if waiting < WINDOW:
+                    continue
+                name = self.pop()
+                waiting -= 1
+            yield name
+        while True:
+            with self.lock:
+                name = self.pop()
+            if name is None:
+                return
+            yield name
+
+    def done(self,name,hit):
+        """
+        PURPOSE: Count the result of a candidate handed out by schedule
+        INPUT: Normalized name, True if the bucket exists (None - no answer, not counted)
+        RETURN: None
+        """
+        with self.lock:
+            pattern = self.inflight.pop(name,None)
+        if pattern is not None and hit is not None:
+            self.record(pattern,hit)
+
+    def record(self,pattern,hit):
+        """
+        PURPOSE: Count a result for each part of a pattern, and move the modifier's waiting
+                 candidates to their new place
+        INPUT: (modifier, combinator, position), True if the bucket exists
+        RETURN: None
+        """
+        with self.lock:
+            for kind, value in zip(KINDS,pattern):
+                counts = self.run[kind].setdefault(value,[0,0])
+                counts[0] += int(hit)
+                counts[1] += 1
+            self.stats['recorded'] += 1
+            self.stats['hits'] += int(hit)
+            modifier = pattern[0]
+            self.versions[modifier] = self.versions.get(modifier,0) + 1
+            for name, (lane, waitingPattern) in self.waiting.get(modifier,{}).items():
+                self.push(modifier,name,lane,waitingPattern)
+
+    def report(self,top=3):
+        """
+        PURPOSE: Describe what the run learned
+        INPUT: Number of patterns and modifiers to name
+        RETURN: String like "14 of 1200 hit; combinators '-' 11/600, '' 3/600; positions
+                suffix 10/600, prefix 4/600; modifiers dev 2/4, prod 2/4, backup 1/4"
+        """
+        with self.lock:
+            combinators = sorted(self.run["combinator"].items(),key=lambda item: -hitRate(*item[1]))
+            positions = sorted(self.run["position"].items(),key=lambda item: -hitRate(*item[1]))
+            modifiers = sorted(
+                ((m,c) for m, c in self.run["modifier"].items() if c[0]),key=lambda item: -hitRate(*item[1])
+            )
+        return "{} of {} hit; combinators {}; positions {}; modifiers {}".format(
+            self.stats['hits'],self.stats['recorded'],
+            ", ".join("'{}' {}/{}".format(v,*c) for v, c in combinators[:top]) or "-",
+            ", ".join("{} {}/{}".format(v,*c) for v, c in positions[:top]) or "-",
+            ", ".join("{} {}/{}".format(v,*c) for v, c in modifiers[:top]) or "-"
+        )
+
+    def close(self):
+        """
+        PURPOSE: Add this run's counts to the priors table
+        INPUT: Self
+        RETURN: None
+        """
+        if not self.db:
+            return
+        with self.lock:
+            rows = [
+                (kind,value,hits,tries)
+                for kind in KINDS for value, (hits, tries) in self.run[kind].items()
+            ]
+        with self.dblock:
+            self.db.executemany(
+                "INSERT INTO priors VALUES (?,?,?,?) ON CONFLICT (kind, value) DO UPDATE SET "
+                "hits = hits + excluded.hits, tries = tries + excluded.tries",
+                rows
+            )
+            self.db.commit()
+            if not self.shared:
+                self.db.close() # the store closes its own
+            self.db = None
@@ -0,0 +1,207 @@
+#/usr/bin/env python3
+import csv
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+# GLOBALS
+BATCH = 100         # records written per batch
+FLUSH_INTERVAL = 1  # seconds a partial batch may wait before it is written
+FIELDS = [
+    "name","status","state","url","region","download","write",
+    "objects","truncated","sampled","meta","found"
+]
+STATES = ["non-existent","denied","disabled","open","readable","writeable"]
+
+# HELPERS
+def bucketRecord(bucket):
+    """
+    PURPOSE: Flatten a classified bucket into a structured result record
+    INPUT: Bucket object
+    RETURN: dict with every key in FIELDS
+    """
+    return {
+        "name":bucket.name,
+        "status":bucket.status,
+        "state":STATES[bucket.status] if 0 <= bucket.status < len(STATES) else "rate-limited",
+        "url":bucket.url,
+        "region":bucket.region,
+        "download":bucket.download,
+        "write":bucket.write,
+        "objects":bucket.objects,
+        "truncated":bucket.truncated,
+        "sampled":"{}/{}".format(*bucket.sampled) if bucket.sampled else None,
+        "meta":bucket.meta,
+        "found":time.time()
+    }
+
+class ResultSink:
+    """
+    PURPOSE: Write result records to a file from a background thread as they arrive
+    INPUT: Output path, Logger, records per batch, seconds a partial batch may wait
+    DOCS:
+    |__ Workers only put records on a queue. One writer thread batches them and hands
+    |__ each batch to writeBatch, so slow disks never hold up a probe. Subclasses
+    |__ implement openOutput, writeBatch and closeOutput, which all run on the writer.
+    |__ A batch that fails to write (disk full, encoding error, locked database) is
+    |__ logged and counted as lost, and the writer keeps draining the queue. If the
+    |__ output never opened, every record is lost.
+    |__[ATTR] WRITTEN, LOST
+    |_____ Records written, records that could not be written
+    |__[FUNC] write - queue a record
+    |__[FUNC] close - drain the queue, close the output and report any lost records
+    """
+
+    def __init__(self,path,logger,batch=BATCH,interval=FLUSH_INTERVAL):
+        self.path = path
+        self.logger = logger
+        self.batch = batch
+        self.interval = interval
+        self.written = 0
+        self.lost = 0
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.run,daemon=True)
+        self.writer.start()
+
+    def write(self,record):
+        self.queue.put(record)
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        if self.lost:
+            self.logger.log("SINK","ERRO","{} of {} findings could not be written to {}".format(
+                self.lost,self.lost + self.written,self.path
+            ))
+
+    def run(self):
+        try:
+            self.openOutput()
+            opened = True
+        except Exception as e:
+            self.logger.log("SINK","ERRO","Unable to open {}: {}".format(self.path,e))
+            opened = False
+        pending = []
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0,deadline - time.monotonic()))
+            except queue.Empty:
+                record = False
+            if record:
+                pending.append(record)
+            if record is None or len(pending) >= self.batch or time.monotonic() >= deadline:
+                if pending and not opened:
+                    self.lost += len(pending)
+                elif pending:
+                    try:
+                        self.writeBatch(pending)
+                        self.written += len(pending)
+                    except Exception as e:
+                        self.lost += len(pending)
+                        self.logger.log("SINK","ERRO","Unable to write {} findings to {}: {}".format(
+                            len(pending),self.path,e
+                        ))
+                pending = []
+                deadline = time.monotonic() + self.interval
+            if record is None:
+                break
+        if opened:
+            try:
+                self.closeOutput()
+            except Exception as e:
+                self.logger.log("SINK","ERRO","Unable to close {}: {}".format(self.path,e))
+
+    def openOutput(self):
+        raise NotImplementedError
+
+    def writeBatch(self,records):
+        raise NotImplementedError
+
+    def closeOutput(self):
+        raise NotImplementedError
+
+class JSONLSink(ResultSink):
+    """
+    PURPOSE: One JSON object per line
+    """
+
+    def openOutput(self):
+        self.output = open(self.path,"a")
+
+    def writeBatch(self,records):
+        self.output.write("".join(json.dumps(record) + "\n" for record in records))
+        self.output.flush()
+
+    def closeOutput(self):
+        self.output.close()
+
+class CSVSink(ResultSink):
+    """
+    PURPOSE: CSV with a FIELDS header, written once for a new file
+    """
+
+    def openOutput(self):
+        self.output = open(self.path,"a",newline="")
+        self.csv = csv.DictWriter(self.output,fieldnames=FIELDS)
+        if self.output.tell() == 0:
+            self.csv.writeheader()
+
+    def writeBatch(self,records):
+        self.csv.writerows(records)
+        self.output.flush()
+
+    def closeOutput(self):
+        self.output.close()
+
+class SQLiteSink(ResultSink):
+    """
+    PURPOSE: A findings table with one row per result, committed per batch
+    """
+
+    def openOutput(self):
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS findings ({})".format(",".join(FIELDS)))
+        self.db.commit()
+
+    def writeBatch(self,records):
+        self.db.executemany(
+            "INSERT INTO findings VALUES ({})".format(",".join("?" * len(FIELDS))),
+            [[record[field] for field in FIELDS] for record in records]
+        )
+        self.db.commit()
+
+    def closeOutput(self):
+        self.db.close()
+
+SINKS = {
+    "jsonl":JSONLSink,
+    "csv":CSVSink,
+    "sqlite":SQLiteSink
+}
+EXTENSIONS = {
+    ".jsonl":"jsonl",
+    ".json":"jsonl",
+    ".csv":"csv",
+    ".db":"sqlite",
+    ".sqlite":"sqlite",
+    ".sqlite3":"sqlite"
+}
+
+def openSink(spec,logger):
+    """
+    PURPOSE: Build a sink from "format:path" or a path with a known extension
+    INPUT: Sink spec, e.g. "results.jsonl" or "csv:out.txt", Logger for write errors
+    RETURN: ResultSink
+    """
+    kind, sep, path = spec.partition(":")
+    if not sep or kind not in SINKS:
+        path = spec
+        kind = next((k for ext, k in EXTENSIONS.items() if spec.lower().endswith(ext)),None)
+        if kind is None:
+            raise ValueError("Unknown result format for {}, use one of {}".format(
+                spec,",".join("{}:<path>".format(k) for k in SINKS)
+            ))
+    return SINKS[kind](path,logger)
@@ -0,0 +1,99 @@
+#/usr/bin/env python3
+import sqlite3
+import threading
+import time
+
+# GLOBALS
+TTL = 86400 # seconds a cached result stays fresh
+# seconds a write waits for another process's transaction (local shards share the file)
+TIMEOUT = 30
+
+class ResultStore:
+    """
+    PURPOSE: Persist probe results on disk so later runs can skip fresh ones
+    INPUT: Path to the SQLite database, TTL in seconds (None - results never expire,
+           0 - results are only recorded, e.g. for a later --resume)
+    DOCS:
+    |__[ATTR] RESULTS TABLE
+    |_____ name: normalized bucket name (primary key)
+    |_____ status: final Bucket status (0-5), rate limited buckets are never stored
+    |_____ checked: epoch time of the probe
+    |_____ url, download, write, meta, content: Bucket attributes for the report
+    |__[ATTR] STATS
+    |_____ recorded: results written during this run
+    |_____ skipped: candidates skipped because a fresh result was already stored
+    |__[ATTR] WRITES
+    |_____ Every write is committed at once, so no transaction is left open for other
+    |_____ processes on the same file to wait on (WAL commits don't sync to disk).
+    |__[FUNC] lookup, record, count, close
+    """
+
+    def __init__(self,path,ttl=TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stats = {
+            "recorded":0,
+            "skipped":0
+        }
+        self.db = sqlite3.connect(path,timeout=TIMEOUT,check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "name TEXT PRIMARY KEY, status INTEGER, checked REAL, url TEXT, "
+            "download INTEGER, write INTEGER, meta TEXT, content TEXT)"
+        )
+        self.db.commit()
+
+    def lookup(self,name):
+        """
+        PURPOSE: Find a fresh stored result for a bucket name
+        INPUT: Normalized bucket name
+        RETURN: dict of the stored columns, or None if missing or expired
+        """
+        if self.ttl == 0:
+            return None
+        oldest = 0 if self.ttl is None else time.time() - self.ttl
+        with self.lock:
+            row = self.db.execute(
+                "SELECT name,status,checked,url,download,write,meta,content "
+                "FROM results WHERE name=? AND checked>=?",
+                (name,oldest)
+            ).fetchone()
+        if row is None:
+            return None
+        self.stats['skipped'] += 1
+        keys = ["name","status","checked","url","download","write","meta","content"]
+        return dict(zip(keys,row))
+
+    def record(self,bucket):
+        """
+        PURPOSE: Store the final state of a probed bucket
+        INPUT: Bucket object
+        RETURN: None
+        """
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?,?,?)",
+                (
+                    bucket.name,bucket.status,time.time(),bucket.url,
+                    int(bucket.download),int(bucket.write),bucket.meta,bucket.content
+                )
+            )
+            self.db.commit()
+            self.stats['recorded'] += 1
+
+    def count(self):
+        """
+        PURPOSE: Count the stored results
+        INPUT: Self
+        RETURN: Number of rows in the results table
+        """
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
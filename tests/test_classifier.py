@@ -0,0 +1,64 @@
+#/usr/bin/env python3
+import sys
+from pathlib import Path
+
+sys.path.insert(0,str(Path(__file__).resolve().parent.parent))
+
+from classifier import (
+    classify, checkFixtures, errorCode, isThrottled,
+    THROTTLED, NONEXISTENT, DENIED, DISABLED, LISTABLE, READABLE, WRITEABLE, OBJECT, WRITE
+)
+
+# HELPERS
+def errorBody(code,padding=0):
+    return (
+        b'<?xml version="1.0" encoding="UTF-8"?>\n' + b" " * padding +
+        b"<Error><Code>" + code + b"</Code><Message>mock</Message></Error>"
+    )
+
+
+def test_fixtures_classify_as_recorded():
+    assert checkFixtures() == []
+
+def test_error_code():
+    assert errorCode(errorBody(b"NoSuchBucket")) == b"NoSuchBucket"
+    assert errorCode(b"") is None
+    assert errorCode(b"<ListBucketResult></ListBucketResult>") is None
+
+def test_error_code_only_read_from_the_start_of_the_body():
+    # <Code> is looked for in the first 512 bytes only
+    assert errorCode(errorBody(b"AccessDenied",padding=600)) is None
+    # a body cut off before </Code>
+    assert errorCode(b"<Error><Code>AccessDen") is None
+
+def test_head_403_is_denied():
+    assert classify(403,{}) == DENIED
+
+def test_head_404_is_nonexistent():
+    assert classify(404,{}) == NONEXISTENT
+
+def test_error_codes():
+    assert classify(403,{},errorBody(b"AllAccessDisabled")) == DISABLED
+    assert classify(404,{},errorBody(b"NoSuchBucket")) == NONEXISTENT
+    assert classify(301,{},errorBody(b"PermanentRedirect")) == DENIED
+    assert classify(200,{},b"<ListBucketResult></ListBucketResult>") == LISTABLE
+
+def test_503_without_body_is_throttled():
+    assert classify(503,{}) == THROTTLED
+    assert isThrottled(503)
+
+def test_throttling_code_is_throttled_whatever_the_kind():
+    body = errorBody(b"SlowDown")
+    assert isThrottled(400,body)
+    for kind in (OBJECT,WRITE):
+        assert classify(400,{},body,kind) == THROTTLED
+
+def test_object_416_is_readable():
+    # an empty object can't satisfy bytes=0-0
+    assert classify(416,{},kind=OBJECT) == READABLE
+    assert classify(206,{},kind=OBJECT) == READABLE
+    assert classify(403,{},errorBody(b"AccessDenied"),OBJECT) == LISTABLE
+
+def test_write():
+    assert classify(200,{},kind=WRITE) == WRITEABLE
+    assert classify(403,{},errorBody(b"AccessDenied"),WRITE) == LISTABLE
@@ -0,0 +1,360 @@
+#/usr/bin/env python3
+import asyncio
+import threading
+import time
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import httpx
+    import h2 # httpx only speaks HTTP/2 with it installed
+except ImportError:
+    httpx = None
+
+from ratelimit import TokenBucket
+from counters import ShardedCounter
+from metrics import Metrics
+
+# GLOBALS
+TIMEOUT = 3
+POOLSIZE = 10
+# Request stages, each with its own optional rate budget
+PROBE = "probe" # existence probes (HEAD / root GET)
+DEEP = "deep"   # listing, readability, writeability and metadata
+STALL = 0.01 # seconds an HTTP/2 request may wait behind other streams before it counts as stalled
+
+# HELPERS
+def streamReport(requests,streams,stalls,stall_ms,fallback):
+    """
+    PURPOSE: Describe HTTP/2 stream concurrency and head-of-line stalls
+    INPUT: The STREAMS counters of a Transport (summed over shards, if any)
+    RETURN: String like "812 requests, 6.3 streams per connection, 4 head-of-line stalls
+            (61 ms), 0 over HTTP/1.1"
+    """
+    return "{} requests, {:.1f} streams per connection, {} head-of-line stalls ({} ms), {} over HTTP/1.1".format(
+        requests,streams / max(requests,1),stalls,stall_ms,fallback
+    )
+
+class PoolAdapter(HTTPAdapter):
+    """
+    PURPOSE: Remember which connection pool served the last request and how many
+             connections it had opened, so reuse can be counted per call
+    """
+    pool = None
+    opened = 0
+
+    def track(self,pool):
+        self.pool = pool
+        self.opened = pool.num_connections
+        return pool
+
+    def get_connection(self,*args,**kwargs):
+        return self.track(super().get_connection(*args,**kwargs))
+
+    def get_connection_with_tls_context(self,*args,**kwargs):
+        return self.track(super().get_connection_with_tls_context(*args,**kwargs))
+
+class H2Response:
+    """
+    PURPOSE: Give an httpx response the parts of the requests.Response API Bucket uses
+    INPUT: httpx.Response, callable run once the response is finished with
+    """
+
+    def __init__(self,response,done):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.done = done
+
+    @property
+    def content(self):
+        return self.response.read()
+
+    @property
+    def text(self):
+        self.response.read()
+        return self.response.text
+
+    def iter_content(self,size):
+        return self.response.iter_bytes(size)
+
+    def close(self):
+        self.response.close()
+        if self.done:
+            self.done()
+            self.done = None
+
+class Transport:
+    """
+    PURPOSE: Provide pooled keep-alive HTTP shared by every Bucket request
+    INPUT: Number of pooled connections per worker, connect and read timeouts
+    DOCS:
+    |__[ATTR] POOLSIZE
+    |_____ Number of hosts (and connections per host) kept alive by each worker. Follow-up
+    |_____ requests for a bucket go to the same host, so they reuse the probe's connection.
+    |__[ATTR] TIMEOUT
+    |_____ (connect, read) timeout tuple applied to every request
+    |__[ATTR] STATS
+    |_____ requests: total requests sent through the transport
+    |_____ new: requests that had to open a new TCP/TLS connection
+    |_____ reused: requests sent over an already open keep-alive connection
+    |__[ATTR] BUDGETS
+    |_____ Optional TokenBucket per stage plus "total" shared by every request. A request
+    |_____ waits on its stage's budget and the total budget before it is sent.
+    |__[ATTR] SENT
+    |_____ Requests sent per stage, for achieved vs. allowed rate reporting
+    |__[ATTR] METRICS
+    |_____ Latency and bytes received per request kind and HTTP status
+    |__[ATTR] HTTP2
+    |_____ After useHTTP2, requests are multiplexed as HTTP/2 streams over one shared
+    |_____ connection per host (httpx). https negotiates the protocol, plain http assumes
+    |_____ HTTP/2 and a host that doesn't speak it goes back to the HTTP/1.1 pools.
+    |__[ATTR] STREAMS
+    |_____ (streamReport formats them)
+    |_____ requests: requests answered over HTTP/2
+    |_____ streams: streams in flight on the host's connection as each one started, summed
+    |_____ stalls: requests that waited more than STALL seconds behind other streams (for a
+    |_____         stream slot or the connection) before their headers went out
+    |_____ stall_ms: total time spent stalled
+    |_____ fallback: requests sent over HTTP/1.1 instead
+    |__[FUNC] get, head, put, request
+    |__[FUNC] setBudget, throttle / throttleAsync, rateReport
+    |__[FUNC] useHTTP2
+    |__[FUNC] asyncSession - aiohttp session with the same timeouts and counters
+    """
+
+    def __init__(self,poolsize=POOLSIZE,connect_timeout=TIMEOUT,read_timeout=TIMEOUT):
+        self.poolsize = poolsize
+        self.timeout = (connect_timeout,read_timeout)
+        self.local = threading.local()
+        self.stats = ShardedCounter(["requests","new","reused"])
+        self.budgets = {}
+        self.sent = ShardedCounter([PROBE,DEEP])
+        self.metrics = Metrics()
+        self.started = time.monotonic()
+        self.clients = None # scheme -> httpx.Client, once useHTTP2 succeeds
+        self.streams = ShardedCounter(["requests","streams","stalls","stall_ms","fallback"])
+        self.inflight = {} # host -> HTTP/2 requests in flight
+        self.connections = set() # HTTP/2 connections seen, to count new ones
+        self.h1hosts = set() # hosts that answered the HTTP/2 preface with something else
+        self.h2hosts = set()
+        self.lock = threading.Lock()
+
+    def useHTTP2(self):
+        """
+        PURPOSE: Multiplex every request as HTTP/2 streams, one connection per host
+        INPUT: Self
+        RETURN: False if httpx with HTTP/2 support is not installed
+        """
+        if httpx is None:
+            return False
+        timeout = httpx.Timeout(self.timeout[1],connect=self.timeout[0])
+        self.clients = {
+            # ALPN picks HTTP/2 if the server offers it, else HTTP/1.1
+            "https":httpx.Client(http2=True,timeout=timeout),
+            # no ALPN in cleartext, HTTP/2 is assumed (prior knowledge)
+            "http":httpx.Client(http1=False,http2=True,timeout=timeout)
+        }
+        return True
+
+    def setBudget(self,stage,rps):
+        """
+        PURPOSE: Cap the request rate of a stage ("total" caps every request)
+        INPUT: Stage name, requests per second (None or 0 - unlimited)
+        RETURN: None
+        """
+        if rps:
+            self.budgets[stage] = TokenBucket(rps)
+        else:
+            self.budgets.pop(stage,None)
+
+    def delay(self,stage):
+        self.sent.incr(stage)
+        delay = 0
+        for name in (stage,"total"):
+            if name in self.budgets:
+                delay = max(delay,self.budgets[name].reserve())
+        return delay
+
+    def throttle(self,stage):
+        delay = self.delay(stage)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def throttleAsync(self,stage):
+        delay = self.delay(stage)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def rateReport(self):
+        """
+        PURPOSE: Describe achieved vs. allowed request rate per stage
+        INPUT: Self
+        RETURN: String like "probe 48.9/50 rps, deep 2.1/unlimited rps, total 51.0/60 rps"
+        """
+        elapsed = max(time.monotonic() - self.started,1e-6)
+        achieved = self.sent.snapshot()
+        achieved["total"] = sum(achieved.values())
+        parts = []
+        for stage in (PROBE,DEEP,"total"):
+            allowed = self.budgets[stage].rate if stage in self.budgets else "unlimited"
+            parts.append("{} {:.1f}/{} rps".format(stage,achieved[stage] / elapsed,allowed))
+        return ", ".join(parts)
+
+    def session(self):
+        """
+        PURPOSE: Get the keep-alive session owned by the calling worker thread
+        INPUT: Self
+        RETURN: requests.Session
+        """
+        session = getattr(self.local,"session",None)
+        if session is None:
+            adapter = PoolAdapter(pool_connections=self.poolsize,pool_maxsize=self.poolsize)
+            session = requests.Session()
+            session.mount("https://",adapter)
+            session.mount("http://",adapter)
+            self.local.session = session
+            self.local.adapter = adapter
+        return session
+
+    def count(self,new):
+        self.stats.incr('requests')
+        self.stats.incr('new' if new else 'reused')
+
+    def request(self,method,url,stage=DEEP,kind=None,**kwargs):
+        """
+        PURPOSE: Send a request over the worker's pool within the stage's rate budget
+                 and record connection reuse and latency
+        INPUT: HTTP method, URL, request stage, request kind for the metrics (default the
+               method), any requests keyword arguments
+        RETURN: requests.Response
+        """
+        self.throttle(stage)
+        kind = kind or method.lower()
+        if self.clients:
+            r = self.requestHTTP2(method,url,kind,**kwargs)
+            if r is not None:
+                return r
+            self.streams.incr('fallback')
+        session = self.session()
+        adapter = self.local.adapter
+        kwargs.setdefault("timeout",self.timeout)
+        start = time.monotonic()
+        try:
+            r = session.request(method,url,**kwargs)
+        except requests.exceptions.RequestException:
+            self.metrics.observe(kind,"error",time.monotonic() - start)
+            raise
+        # streamed bodies are still unread, their reader counts what it reads (Metrics.addBytes)
+        received = 0 if kwargs.get("stream") else len(r.content)
+        self.metrics.observe(kind,r.status_code,time.monotonic() - start,received)
+        self.count(adapter.pool.num_connections > adapter.opened)
+        return r
+
+    def requestHTTP2(self,method,url,kind,**kwargs):
+        """
+        PURPOSE: Send one request as an HTTP/2 stream on the host's shared connection
+        INPUT: HTTP method, URL, request kind for the metrics, requests keyword arguments
+        RETURN: H2Response, or None if the host only speaks HTTP/1.1
+        DOCS:
+        |__ httpx errors are raised as their requests counterparts, so callers catch the same
+        |__ exceptions whichever protocol is in use.
+        """
+        parts = urlsplit(url)
+        host = parts.netloc
+        client = self.clients.get(parts.scheme)
+        if client is None or host in self.h1hosts:
+            return None
+        stream = kwargs.pop("stream",False)
+        kwargs.pop("timeout",None)
+        if "data" in kwargs:
+            kwargs["content"] = kwargs.pop("data")
+        marks = {}
+
+        def trace(event,info):
+            if event == "connection.connect_tcp.started":
+                marks['connect'] = True
+            elif event.endswith("send_request_headers.started"):
+                marks['sent'] = time.monotonic()
+
+        with self.lock:
+            active = self.inflight[host] = self.inflight.get(host,0) + 1
+
+        def done():
+            with self.lock:
+                self.inflight[host] -= 1
+
+        start = time.monotonic()
+        try:
+            r = client.send(client.build_request(method,url,extensions={"trace":trace},**kwargs),stream=stream)
+        except httpx.TimeoutException as e:
+            done()
+            self.metrics.observe(kind,"error",time.monotonic() - start)
+            raise (requests.exceptions.ConnectTimeout if isinstance(e,httpx.ConnectTimeout) else requests.exceptions.ReadTimeout)(e)
+        except httpx.TransportError as e:
+            done()
+            if host not in self.h2hosts and not isinstance(e,httpx.ConnectError):
+                # never spoke HTTP/2, e.g. an HTTP/1.1 server rejecting the preface (requests
+                # racing on the same connection see it closed instead)
+                with self.lock:
+                    self.h1hosts.add(host)
+                return None
+            self.metrics.observe(kind,"error",time.monotonic() - start)
+            raise requests.exceptions.ConnectionError(e)
+        received = 0 if stream else len(r.content)
+        self.metrics.observe(kind,r.status_code,time.monotonic() - start,received)
+        connection = id(r.extensions.get("network_stream"))
+        with self.lock:
+            new = connection not in self.connections
+            self.connections.add(connection)
+            self.h2hosts.add(host)
+        self.count(new)
+        if r.http_version == "HTTP/2":
+            self.streams.incr('requests')
+            self.streams.incr('streams',active)
+            waited = marks.get('sent',start) - start
+            if waited > STALL and not marks.get('connect'):
+                self.streams.incr('stalls')
+                self.streams.incr('stall_ms',int(waited * 1000))
+        else:
+            self.streams.incr('fallback')
+        if not stream:
+            done()
+            return H2Response(r,None)
+        return H2Response(r,done)
+
+    def get(self,url,**kwargs):
+        return self.request("GET",url,**kwargs)
+
+    def head(self,url,**kwargs):
+        return self.request("HEAD",url,**kwargs)
+
+    def put(self,url,**kwargs):
+        return self.request("PUT",url,**kwargs)
+
+    def asyncSession(self,limit):
+        """
+        PURPOSE: Build an aiohttp session that shares this transport's timeouts and counters
+        INPUT: Maximum number of open connections
+        RETURN: aiohttp.ClientSession
+        """
+        async def onCreate(session,context,params):
+            self.count(True)
+
+        async def onReuse(session,context,params):
+            self.count(False)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(onCreate)
+        trace.on_connection_reuseconn.append(onReuse)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=limit,ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0],sock_read=self.timeout[1]),
+            trace_configs=[trace]
+        )